@@ -0,0 +1,47 @@
+# Prints when each better route turns up in an anytime search with a time budget, against the default search that stops
+# once 10 completed routes in a row fail to beat the best.
+# Run from the repository root: python benchmarks/anytime.py [weeks] [seconds]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+
+def scenario():
+    # A new loader each time so both searches start with a cold leg cache
+    ship = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
+    data_loader = DataLoader(ship.max_jump())
+    start = data_loader.load_world_data(SectorHex("Reft", "1822"))
+    capital = 1943650
+    state = {UNCUT_PROFITS: capital - 165175}
+    net_worth = capital - ship.contract.current_cut(state)
+
+    return capital, net_worth, ship, data_loader, start, state
+
+
+def main():
+    weeks = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    capital, net_worth, ship, data_loader, start, state = scenario()
+    stats = SearchStats()
+    start_time = time.perf_counter()
+    best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(max_duration=weeks), 0, [], state, SearchOptions(dominance_pruning=True), stats)
+    print(f"Default search: {time.perf_counter() - start_time:.3f}s, {stats}, profit {best_route.real_profit():,.2f}")
+
+    capital, net_worth, ship, data_loader, start, state = scenario()
+    stats = SearchStats()
+    options = SearchOptions(dominance_pruning=True, patience=None, time_budget=seconds)
+    start_time = time.perf_counter()
+
+    for best_route in iter_best_routes(capital, net_worth, ship, data_loader, start, CompleteCondition(max_duration=weeks), 0, [], state, options, stats):
+        print(f"  {time.perf_counter() - start_time:.3f}s after {stats.expanded:,} routes: profit {best_route.real_profit():,.2f} over {best_route.route_duration} weeks, {best_route.profit_per_week():,.2f} per week")
+
+    print(f"Anytime search: {stats.elapsed:.3f}s, {stats}, profit {best_route.real_profit():,.2f}")
+
+
+if __name__ == "__main__":
+    main()
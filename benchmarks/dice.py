@@ -0,0 +1,51 @@
+# Times the route search with average rolls against simulated dice at several sample counts and prints the spread of profit for each best route.
+# Run from the repository root: python benchmarks/dice.py [weeks] [percentile]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+TRADE_SNAPSHOT = "https://travellertools.azurewebsites.net/Home/TradeInfo?sectorX=-3&sectorY=0&hexX=18&hexY=22&maxJumpDistance=5&brokerScore=2&advancedMode=False&illegalGoods=False&edition=Mongoose2&seed=1583474473&advancedCharacters=False&streetwiseScore=2&milieu=M1105"
+
+
+def run(dice, weeks, snapshot):
+    # A new loader for each run so every run starts with a cold leg cache
+    ship = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
+    data_loader = DataLoader(ship.max_jump())
+    start = data_loader.load_world_data(SectorHex("Reft", "1822"))
+    start.set_trade_snapshot(snapshot)
+    capital = 1943650
+    state = {UNCUT_PROFITS: capital - 165175}
+    net_worth = capital - ship.contract.current_cut(state)
+    stats = SearchStats()
+
+    start_time = time.perf_counter()
+    best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(max_duration=weeks), 0, [], state, SearchOptions(dominance_pruning=True, dice=dice), stats)
+    elapsed = time.perf_counter() - start_time
+
+    return elapsed, stats, best_route
+
+
+def main():
+    weeks = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    percentile = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    snapshot = get_trade_snapshot(TRADE_SNAPSHOT)
+
+    elapsed, stats, best_route = run(None, weeks, snapshot)
+    print(f"Average rolls: {elapsed:.3f}s, {stats}, profit {best_route.real_profit():,.2f}")
+    print(" -> ".join(str(world) for world in best_route.worlds))
+
+    for samples in (100, 1000, 10000):
+        dice = DiceSimulator(samples, percentile)
+        elapsed, stats, best_route = run(dice, weeks, snapshot)
+        per_route = stats.expanded and elapsed / stats.expanded
+        print(f"{samples:,} samples: {elapsed:.3f}s ({per_route * 1000:.1f}ms per expanded route), {stats}, profit at percentile {percentile} {best_route.ranking_profit():,.2f}")
+        print(" -> ".join(str(world) for world in best_route.worlds))
+        print(dice.describe(best_route))
+
+
+if __name__ == "__main__":
+    main()
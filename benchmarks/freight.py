@@ -0,0 +1,60 @@
+# Compares the in-process freight knapsack with the PuLP/CBC model it replaced on random freight lots.
+# Run from the repository root: python benchmarks/freight.py
+import os
+import random
+import sys
+import time
+
+import pulp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import best_freight_lots
+
+LOT_SIZES = [1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 40, 50, 60]
+
+
+def cbc_freight_lots(lots, cargo):
+    # The model World.freight_snapshot used to build for every leg from the snapshot world
+    problem = pulp.LpProblem('Freight', pulp.LpMaximize)
+    total = 0
+    vars = []
+
+    for i, tons in enumerate(lots):
+        variable = pulp.LpVariable(f"x{i + 1}", cat="Binary")
+        total += tons * variable
+        vars.append(variable)
+
+    problem += total <= cargo
+    problem += total
+    problem.solve(pulp.PULP_CBC_CMD(msg=False))
+
+    return [i for i, variable in enumerate(vars) if pulp.value(variable) == 1]
+
+
+def main(cases=200):
+    rng = random.Random(1105)
+    problems = []
+
+    for _ in range(cases):
+        lots = [float(rng.choice(LOT_SIZES)) for _ in range(rng.randint(0, 20))]
+        problems.append((lots, rng.randint(0, 200)))
+
+    timings = {}
+    totals = {}
+
+    for name, solve in [("cbc", cbc_freight_lots), ("knapsack", best_freight_lots)]:
+        start_time = time.perf_counter()
+        totals[name] = [sum(lots[i] for i in solve(lots, cargo)) for lots, cargo in problems]
+        timings[name] = time.perf_counter() - start_time
+
+    mismatches = sum(1 for a, b in zip(totals["cbc"], totals["knapsack"]) if a != b)
+
+    print(f"{'solver':<10} {'seconds':>10} {'per call (ms)':>14}")
+    for name, elapsed in timings.items():
+        print(f"{name:<10} {elapsed:>10.3f} {elapsed * 1000 / cases:>14.3f}")
+    print(f"{mismatches} of {cases} totals differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Compares the memory and time of a long search with the whole frontier in memory, spilled to disk and cut down to a beam,
+# and whether each finds the same route. Every policy runs in its own process so its peak memory is its own.
+# Run from the repository root: python benchmarks/frontier.py [weeks] [patience]
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+POLICIES = [
+    ("heap", dict()),
+    ("spill 5,000", dict(spill_routes=5000)),
+    ("beam 300 per depth", dict(beam_width=300)),
+    ("beam 100 per week", dict(beam_width=100, beam_by="week")),
+]
+
+
+def run(weeks, patience, policy):
+    ship = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
+    data_loader = DataLoader(ship.max_jump())
+    start = data_loader.load_world_data(SectorHex("Reft", "1822"))
+    capital = 1943650
+    state = {UNCUT_PROFITS: capital - 165175}
+    net_worth = capital - ship.contract.current_cut(state)
+    stats = SearchStats()
+
+    memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.perf_counter()
+    best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(max_duration=weeks), 0, [], state, SearchOptions(patience=patience, **policy), stats)
+    elapsed = time.perf_counter() - start_time
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory_before
+
+    return elapsed, memory, str(stats), stats.max_frontier, best_route.real_profit(), [str(world) for world in best_route.worlds]
+
+
+def main():
+    weeks = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    patience = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    heap_worlds = None
+
+    for name, policy in POLICIES:
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            elapsed, memory, stats, max_frontier, profit, worlds = pool.apply(run, (weeks, patience, policy))
+
+        heap_worlds = heap_worlds or worlds
+        print(f"{name}: {elapsed:.2f}s, peak memory up {memory / 1024:.0f}MB, largest frontier {max_frontier:,} routes, profit {profit:,.2f}" + ("" if worlds == heap_worlds else ", a different route to the heap"))
+        print(f"  {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Times the route search with leg evaluation spread over 1 to N worker processes and checks every run picks the serial route.
+# Run from the repository root: python benchmarks/parallel.py [max workers] [weeks]
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+TRADE_SNAPSHOT = "https://travellertools.azurewebsites.net/Home/TradeInfo?sectorX=-3&sectorY=0&hexX=18&hexY=22&maxJumpDistance=5&brokerScore=2&advancedMode=False&illegalGoods=False&edition=Mongoose2&seed=1583474473&advancedCharacters=False&streetwiseScore=2&milieu=M1105"
+
+
+def run(workers, weeks, snapshot):
+    # A new loader for each run so every run starts with a cold leg cache
+    ship = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
+    data_loader = DataLoader(ship.max_jump())
+    start = data_loader.load_world_data(SectorHex("Reft", "1822"))
+    start.set_trade_snapshot(snapshot)
+    capital = 1943650
+    state = {UNCUT_PROFITS: capital - 165175}
+    net_worth = capital - ship.contract.current_cut(state)
+    stats = SearchStats()
+
+    start_time = time.perf_counter()
+    best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(max_duration=weeks), 0, [], state, SearchOptions(workers=workers), stats)
+    elapsed = time.perf_counter() - start_time
+
+    return elapsed, stats, [str(world) for world in best_route.worlds], best_route.real_profit()
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+    weeks = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    snapshot = get_trade_snapshot(TRADE_SNAPSHOT)
+
+    serial_time, stats, serial_worlds, serial_profit = run(1, weeks, snapshot)
+    print(f"{'workers':>7} {'seconds':>10} {'speedup':>8} {'same route':>10}")
+    print(f"{1:>7} {serial_time:>10.3f} {1:>8.2f} {'yes':>10}")
+
+    for workers in range(2, max_workers + 1):
+        elapsed, _, worlds, profit = run(workers, weeks, snapshot)
+        same = "yes" if worlds == serial_worlds and profit == serial_profit else "NO"
+        print(f"{workers:>7} {elapsed:>10.3f} {serial_time / elapsed:>8.2f} {same:>10}")
+
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Times a cold cache search against a local stand-in for the travellermap jumpworlds API with and without prefetching.
+# The stand-in answers from a saved sector (cache/sectors/reft.json, see SectorStore.load_sector) and adds a fixed latency.
+# Run from the repository root: python benchmarks/prefetch.py [latency ms]
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+
+def stand_in_server(sector_store, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+
+            if url.path != "/api/jumpworlds":
+                self.send_error(404)
+                return
+
+            time.sleep(latency)
+            sector_hex = SectorHex(query["sector"][0], query["hex"][0])
+            body = json.dumps(sector_store.jump_worlds(sector_hex, int(query["jump"][0])) or {"Worlds": []}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(base_url, prefetcher):
+    ship = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data_loader = DataLoader(ship.max_jump(), prefetcher=prefetcher, cache_dir=cache_dir, base_url=base_url)
+        capital = 1943650
+        state = {UNCUT_PROFITS: capital - 165175}
+        net_worth = capital - ship.contract.current_cut(state)
+
+        start_time = time.perf_counter()
+        start = data_loader.load_world_data(SectorHex("Reft", "1822"))
+        stop = data_loader.load_world_data(SectorHex("Reft", "1426"))
+        best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(stop), 0, [], state)
+        return time.perf_counter() - start_time, [str(world) for world in best_route.worlds]
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 150) / 1000
+    sector_store = SectorStore()
+    sector_store.load_sector("Reft")
+    server = stand_in_server(sector_store, latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    serial_time, serial_worlds = run(base_url, None)
+    prefetcher = JumpDataPrefetcher(base_url, concurrency=8, requests_per_second=50)
+    prefetch_time, prefetch_worlds = run(base_url, prefetcher)
+    prefetcher.close()
+    server.shutdown()
+
+    print(f"{'loader':<10} {'seconds':>10}")
+    print(f"{'blocking':<10} {serial_time:>10.3f}")
+    print(f"{'prefetch':<10} {prefetch_time:>10.3f}  {prefetcher.requests} requests, same route: {'yes' if serial_worlds == prefetch_worlds else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Times each rule table lookup of the DataLoader against the JSON dict lookups it replaced and checks both give the same values.
+# Run from the repository root: python benchmarks/rules.py [lookups]
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+
+class LegacyRules:
+    # The lookups as they were before, clamping the roll then indexing the JSON with str(roll) on every call
+    def __init__(self) -> None:
+        with open('modifiedPrice.json', 'r') as file:
+            self.__modified_price = json.load(file)
+
+        with open('passengerCount.json', 'r') as file:
+            self.__passenger_count = json.load(file)
+
+        with open('passageFreight.json', 'r') as file:
+            self.__passage_freight = json.load(file)
+
+    def passenger_count(self, roll):
+        if roll < 1:
+            roll = 1
+        elif roll > 20:
+            roll = 20
+
+        return self.__passenger_count[str(roll)] * AVERAGE_D6
+
+    def mean_passenger_count(self, roll):
+        upper = self.passenger_count(math.ceil(roll))
+        lower = self.passenger_count(math.floor(roll))
+
+        return (upper + lower) /2
+
+    def modified_price(self, roll, type):
+        if roll < -3:
+            roll = -3
+        elif roll > 25:
+            roll = 25
+
+        return self.__modified_price[str(roll)][type]
+
+    def passage(self, type, distance):
+        return self.__passage_freight[str(distance)][type]
+
+
+def time_lookups(lookup, arguments):
+    start_time = time.perf_counter()
+
+    for argument in arguments:
+        lookup(*argument)
+
+    return (time.perf_counter() - start_time) / len(arguments)
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    legacy = LegacyRules()
+    data_loader = DataLoader(1)
+
+    cases = [
+        ("modified_price", [(roll, type) for roll in range(-6, 29) for type in ("purchase", "sale")]),
+        ("passenger_count", [(roll,) for roll in range(-3, 24)]),
+        ("mean_passenger_count", [(roll + fraction,) for roll in range(-3, 24) for fraction in (0, 0.5)]),
+        ("passage", [(type, distance) for distance in range(1, 7) for type in ("high", "middle", "basic", "low", "freight")]),
+    ]
+
+    for name, arguments in cases:
+        for argument in arguments:
+            if getattr(legacy, name)(*argument) != getattr(data_loader, name)(*argument):
+                raise Exception(f"{name}{argument} differs from the JSON lookup")
+
+        arguments = (arguments * (lookups // len(arguments) + 1))[:lookups]
+        before = time_lookups(getattr(legacy, name), arguments)
+        after = time_lookups(getattr(data_loader, name), arguments)
+        print(f"{name}: {before * 1e9:.0f}ns before, {after * 1e9:.0f}ns after per lookup ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Compares the route search before and after priorities were precomputed on the main() Perfect Stranger scenario.
+# Run from the repository root: python benchmarks/search.py
+import heapq
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+TRADE_SNAPSHOT = "https://travellertools.azurewebsites.net/Home/TradeInfo?sectorX=-3&sectorY=0&hexX=18&hexY=22&maxJumpDistance=5&brokerScore=2&advancedMode=False&illegalGoods=False&edition=Mongoose2&seed=1583474473&advancedCharacters=False&streetwiseScore=2&milieu=M1105"
+
+
+class LegacyRoute:
+    # Route ordering as it was before, recomputed on every heap comparison
+    def __init__(self, route) -> None:
+        self.route = route
+
+    def __lt__(self, other):
+        if other is None:
+            return True
+
+        factor = self.route.projected_duration() / other.route.projected_duration()
+        other_capital_normalised = other.route.profit_per_week() * factor
+        return self.route.profit_per_week() > other_capital_normalised
+
+
+def legacy_find_best_route(capital, net_worth, ship, data_loader, start, destination, start_duration, avoid, state, stats):
+    context = SearchContext(capital, net_worth, start, avoid, destination, ship, data_loader, start_duration)
+    routes = [LegacyRoute(Route(context, start, state=state))]
+    best_route = None
+    completed_routes = 0
+
+    while routes and completed_routes < 10:
+        route = heapq.heappop(routes).route
+        stats.expanded += 1
+
+        for new_route in route.generate_next_steps():
+            new_route = LegacyRoute(new_route)
+
+            if new_route.route.complete:
+                stats.completed += 1
+                completed_routes += 1
+                if new_route < best_route:
+                    completed_routes = 0
+                    best_route = new_route
+            else:
+                heapq.heappush(routes, new_route)
+                routes.append(new_route)
+
+    return best_route.route if best_route else None
+
+
+def scenario():
+    ship = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
+    data_loader = DataLoader(ship.max_jump())
+    start = data_loader.load_world_data(SectorHex("Reft", "1822"))
+    start.set_trade_snapshot(get_trade_snapshot(TRADE_SNAPSHOT))
+    stop = data_loader.load_world_data(SectorHex("Reft", "1426"))
+    capital = 1943650
+    state = {UNCUT_PROFITS: capital - 165175}
+    net_worth = capital - ship.contract.current_cut(state)
+    return (capital, net_worth, ship, data_loader, start, CompleteCondition(stop), 0, [], state)
+
+
+def run(name, search):
+    # A fresh scenario, and with it a fresh DataLoader, so neither search starts with the other's leg cache and price tables
+    args = scenario()
+    stats = SearchStats()
+    state = args[-1].copy()
+    start_time = time.perf_counter()
+    best_route = search(*args[:-1], state, stats=stats)
+    elapsed = time.perf_counter() - start_time
+    profit = best_route.real_profit() if best_route else 0
+    print(f"{name:<8} {stats.expanded:>10,} {elapsed:>10.3f} {profit:>16,.2f}")
+
+
+def main():
+    print(f"{'search':<8} {'expanded':>10} {'seconds':>10} {'profit':>16}")
+    run("before", legacy_find_best_route)
+    run("after", find_best_route)
+
+
+if __name__ == "__main__":
+    main()
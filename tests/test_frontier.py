@@ -0,0 +1,73 @@
+# Checks how BeamFrontier fills its beams, with stand-ins for routes that only carry what the frontier looks at.
+# Run from the repository root: python -m unittest discover tests
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import *
+
+
+def route(priority, depth=1, bound=None):
+    # Smaller priorities are better, as with Route
+    return SimpleNamespace(priority=(priority, 0), depth=depth, total_duration=2 * depth, dominated=False, bound=bound)
+
+
+class BeamFrontierTest(unittest.TestCase):
+    def test_worst_route_is_pushed_out(self):
+        stats = SearchStats()
+        frontier = BeamFrontier(2, "depth", stats)
+        routes = [route(1.0, bound=10.0), route(3.0, bound=30.0), route(2.0, bound=20.0)]
+
+        for pushed in routes:
+            frontier.push(pushed)
+
+        self.assertEqual([frontier.pop(), frontier.pop()], [routes[0], routes[2]])
+        self.assertTrue(routes[1].dominated)
+        self.assertEqual(stats.beam_dropped, 1)
+        self.assertEqual(stats.beam_dropped_bound, 30.0)
+
+    def test_worse_route_is_dropped_when_the_beam_is_full(self):
+        stats = SearchStats()
+        frontier = BeamFrontier(1, "depth", stats)
+        kept = route(1.0)
+        frontier.push(kept)
+        frontier.push(route(2.0))
+
+        self.assertEqual(len(frontier), 1)
+        self.assertIs(frontier.pop(), kept)
+        self.assertEqual(stats.beam_dropped, 1)
+
+    def test_dominated_route_frees_its_place(self):
+        stats = SearchStats()
+        frontier = BeamFrontier(2, "depth", stats)
+        best = route(1.0)
+        dominated = route(3.0)
+        frontier.push(best)
+        frontier.push(dominated)
+        dominated.dominated = True
+
+        # The beam looks full, but the dominated route's place is free so neither route is dropped
+        worse = route(5.0, bound=50.0)
+        frontier.push(worse)
+
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual([frontier.pop(), frontier.pop()], [best, worse])
+        self.assertFalse(worse.dominated)
+        self.assertEqual(stats.beam_dropped, 0)
+        self.assertIsNone(stats.beam_dropped_bound)
+
+    def test_beams_are_per_week(self):
+        stats = SearchStats()
+        frontier = BeamFrontier(1, "week", stats)
+        frontier.push(route(1.0, depth=1))
+        frontier.push(route(2.0, depth=2))
+
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual(stats.beam_dropped, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+# Checks JumpDataPrefetcher against a local stand-in for the travellermap jumpworlds API built from a made up sector.
+# Run from the repository root: python -m unittest discover tests
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from trade import *
+
+
+def made_up_sector():
+    # Worlds on most hexes of the middle of Reft, far enough from the edges that every jump 2 neighbourhood is in the sector
+    rng = random.Random(7)
+    worlds = []
+
+    for hex_x in range(6, 16):
+        for hex_y in range(6, 16):
+            if rng.random() < 0.6:
+                hex = f"{hex_x:02d}{hex_y:02d}"
+                uwp = rng.choice("AABBCCDE") + "".join(rng.choice("0123456789A") for _ in range(6)) + "-" + rng.choice("0123456789ABCD")
+                worlds.append({
+                    "Name": f"World{hex}", "Hex": hex, "UWP": uwp, "Remarks": " ".join(rng.sample(["Ag", "As", "Hi", "In", "Lo", "Na", "Ni", "Ri", "Wa"], 2)),
+                    "Zone": rng.choice(["", "", "", "A"]), "Allegiance": rng.choice(["ImDd", "CsIm"]),
+                    "WorldX": -3 * SECTOR_WIDTH + hex_x - 1, "WorldY": hex_y - SECTOR_HEIGHT,
+                })
+
+    return worlds
+
+
+class StandIn:
+    # Answers jumpworlds requests from a SectorStore after latency seconds and records what it was asked
+    def __init__(self, latency=0.0) -> None:
+        self.sector_store = SectorStore(tempfile.mkdtemp())
+        self.sector_store.ingest_worlds(made_up_sector(), "Reft", -3, 0)
+        self.latency = latency
+        self.requests = []
+        self.started = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Hexes whose next requests are answered with 429, and how many times
+        self.failures = dict()
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                hex = query["hex"][0]
+
+                with stand_in.lock:
+                    stand_in.requests.append(hex)
+                    stand_in.started.append(time.perf_counter())
+                    stand_in.in_flight += 1
+                    stand_in.max_in_flight = max(stand_in.max_in_flight, stand_in.in_flight)
+                    failing = stand_in.failures.get(hex, 0)
+
+                    if failing:
+                        stand_in.failures[hex] = failing - 1
+
+                try:
+                    time.sleep(stand_in.latency)
+
+                    if failing:
+                        self.send_error(429)
+                        return
+
+                    jump_data = stand_in.sector_store.jump_worlds(SectorHex(query["sector"][0], hex), int(query["jump"][0]))
+                    body = json.dumps(jump_data).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stand_in.lock:
+                        stand_in.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def hexes(self):
+        return [world["Hex"] for world in made_up_sector()]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def setUpModule():
+    # The rule tables are read from the working directory
+    global _working_directory
+    _working_directory = os.getcwd()
+    os.chdir(ROOT)
+
+
+def tearDownModule():
+    os.chdir(_working_directory)
+
+
+class JumpDataPrefetcherTest(unittest.TestCase):
+    def start(self, latency=0.0, concurrency=4, requests_per_second=0):
+        stand_in = StandIn(latency)
+        self.addCleanup(stand_in.close)
+        prefetcher = JumpDataPrefetcher(stand_in.base_url, concurrency, requests_per_second)
+        self.addCleanup(prefetcher.close)
+        return stand_in, prefetcher
+
+    def test_requests_are_made_once(self):
+        stand_in, prefetcher = self.start(latency=0.05)
+        hex = stand_in.hexes()[0]
+        saved = []
+        futures = []
+        threads = [threading.Thread(target=lambda: futures.append(prefetcher.fetch("Reft", hex, 2, saved.append))) for _ in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        futures.append(prefetcher.fetch("reft", hex, 2, saved.append))
+        results = [future.result() for future in futures]
+
+        self.assertEqual(stand_in.requests, [hex])
+        self.assertEqual(prefetcher.requests, 1)
+        self.assertEqual(len(saved), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_concurrency_is_limited(self):
+        stand_in, prefetcher = self.start(latency=0.1, concurrency=3)
+        futures = [prefetcher.fetch("Reft", hex, 2, lambda jump_data: None) for hex in stand_in.hexes()[:12]]
+
+        for future in futures:
+            future.result()
+
+        self.assertEqual(len(stand_in.requests), 12)
+        self.assertEqual(stand_in.max_in_flight, 3)
+
+    def test_requests_are_rate_limited(self):
+        stand_in, prefetcher = self.start(concurrency=8, requests_per_second=20)
+        futures = [prefetcher.fetch("Reft", hex, 2, lambda jump_data: None) for hex in stand_in.hexes()[:10]]
+
+        for future in futures:
+            future.result()
+
+        started = sorted(stand_in.started)
+        # Nine gaps of 50ms, less a little for the server noting the time later than the request was sent
+        self.assertGreaterEqual(started[-1] - started[0], 9 * 0.05 * 0.9)
+
+    def test_failed_fetches_are_retried(self):
+        stand_in, prefetcher = self.start()
+        hex = stand_in.hexes()[0]
+        stand_in.failures[hex] = 1
+
+        with self.assertRaises(requests.HTTPError):
+            prefetcher.fetch("Reft", hex, 2, lambda jump_data: None).result()
+
+        jump_data = prefetcher.fetch("Reft", hex, 2, lambda jump_data: None).result()
+
+        self.assertEqual(stand_in.requests, [hex, hex])
+        self.assertIn(hex, [world["Hex"] for world in jump_data["Worlds"]])
+
+    def test_cold_cache_search_matches_blocking_loader(self):
+        stand_in, prefetcher = self.start(latency=0.01, concurrency=8, requests_per_second=200)
+        ship = Ship(4443, 40, 2, 40, 63, 0, [Passage("low", 6), Passage("middle", 7)], None, 2, 2)
+        routes = []
+
+        for loader_prefetcher in (None, prefetcher):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                data_loader = DataLoader(ship.max_jump(), prefetcher=loader_prefetcher, cache_dir=cache_dir, base_url=stand_in.base_url)
+                start = data_loader.load_world_data(SectorHex("Reft", stand_in.hexes()[len(stand_in.hexes()) // 2]))
+                best_route = find_best_route(1000000, 1000000, ship, data_loader, start, CompleteCondition(max_duration=6), 0, [], dict())
+                routes.append(([str(world) for world in best_route.worlds], best_route.text))
+
+                # Files are moved into place whole, so none are left half written
+                self.assertFalse([name for name in os.listdir(cache_dir) if name.endswith(".tmp")])
+
+        self.assertEqual(routes[0], routes[1])
+        self.assertGreater(prefetcher.requests, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,26 @@
 import json
 import math
+import sys
 import requests
 import os.path
 from pathlib import Path
 import heapq
+import sqlite3
+import multiprocessing
+import threading
+import asyncio
 from bs4 import BeautifulSoup
 import hashlib
+import time
+import cProfile
+import functools
+import itertools
+import pickle
+import tempfile
+import weakref
 from urllib.parse import urlparse, parse_qs
-import pulp
+import numpy as np
+from array import array
 
 AVERAGE_D6 = 3.5
 
@@ -23,6 +36,71 @@ class bcolors:
     UNDERLINE = '\033[4m'
 
 
+class LogLine:
+    # Route narrative is only formatted when a route is printed
+    __slots__ = ("template", "args")
+
+    def __init__(self, template, *args) -> None:
+        self.template = template
+        self.args = args
+
+    def __str__(self) -> str:
+        return self.template.format(*self.args)
+
+class LogList:
+    __slots__ = ("separator", "lines")
+
+    def __init__(self, separator, lines) -> None:
+        self.separator = separator
+        self.lines = lines
+
+    def __str__(self) -> str:
+        return self.separator.join(str(line) for line in self.lines)
+
+DICE_TOTALS = dict()
+
+def roll_dice(rng, count, shape):
+    # Totals of count D6 for every entry of shape, looked up from all 6^count equally likely outcomes with one draw each
+    totals = DICE_TOTALS.get(count)
+
+    if totals is None:
+        totals = np.zeros(1, dtype=np.int16)
+
+        for _ in range(count):
+            totals = np.add.outer(totals, np.arange(1, 7, dtype=np.int16)).ravel()
+
+        totals = DICE_TOTALS[count] = totals
+
+    return totals[rng.integers(0, len(totals), shape)]
+
+def best_freight_lots(lots, cargo):
+    # 0/1 knapsack over whole tons, returns the indexes of the lots that fill the most of the cargo hold
+    capacity = math.floor(cargo)
+
+    if capacity < 0:
+        return []
+
+    weights = [math.ceil(tons) for tons in lots]
+    fits = (1 << (capacity + 1)) - 1
+    reachable = 1
+    before = []
+
+    # Bit n of reachable is set when some set of lots weighs exactly n tons
+    for weight in weights:
+        before.append(reachable)
+        reachable = (reachable | (reachable << weight)) & fits
+
+    tons = reachable.bit_length() - 1
+    chosen = []
+
+    for i in reversed(range(len(weights))):
+        if not (before[i] >> tons) & 1:
+            chosen.append(i)
+            tons -= weights[i]
+
+    chosen.reverse()
+    return chosen
+
 class Deal:
     def __init__(self, trade_good, tons, purchase_price, sale_price, sort_value) -> None:
         self.trade_good = trade_good
@@ -33,15 +111,9 @@ class Deal:
 
 
 class TradeGood:
-    def __init__(self, data, data_loader) -> None:
+    def __init__(self, data, data_loader, index) -> None:
         self.name = data["name"]
-        self.__availability = set(data["availability"]) if data["availability"] != "All" else None
-        self.__tons_dice = data["tonsDice"]
-        self.__tons_multiplier = data["tonsMultiplier"]
-        self.__base_price = data["basePrice"]
-        self.__purchase_modifier = data["purchaseModifier"]
-        self.__sale_modifier = data["saleModifier"]
-        self.__max_law_level = data["maxLawLevel"]
+        self.index = index
         self.data_loader = data_loader
 
     def tons_available(self, world, starting_planet):
@@ -50,115 +122,492 @@ class TradeGood:
         
         if starting_planet and world.has_snapshot():
             snapshot = world.get_purchase_snapshot(self.name)
-            return snapshot["tons"]
-
-        modifier = 0
+            return snapshot.tons
 
-        if world.population <= 3:
-            modifier = -3
-        elif world.population >= 9:
-            modifier = 3
-
-        dice_roll = (self.__tons_dice * AVERAGE_D6) + modifier
-        return dice_roll * self.__tons_multiplier
+        return float(self.data_loader.price_table().tons_available(world)[self.index])
     
     def is_available(self, world, starting_planet):
         if starting_planet and world.has_snapshot():
             snapshot = world.get_purchase_snapshot(self.name)
-            return snapshot is not None and snapshot["tons"] != 0
-
-        if world.size is None:
-            return False
-
-        if self.__availability is None:
-            return True
-        
-        trade_codes = set(world.remarks)
+            return snapshot is not None and snapshot.tons != 0
 
-        if trade_codes.intersection(self.__availability):
-            return True
-        
-        return False
+        return bool(self.data_loader.price_table().is_available(world)[self.index])
     
     def is_illegal(self, world):
-        if self.__max_law_level is None:
-            return False
-        
-        return self.__max_law_level <= world.law
+        return not self.data_loader.price_table().is_legal(world)[self.index]
     
     def purchase_price(self, skill, world, starting_planet):
         if starting_planet and world.has_snapshot():
             snapshot = world.get_purchase_snapshot(self.name)
-            return snapshot["currentPrice"]
+            return snapshot.current_price
         
-        return self.__best_price(world, skill, "purchase")
+        return float(self.data_loader.price_table().purchase_prices(world, skill)[self.index])
 
     
     def sale_price(self, skill, world, starting_planet):
         if starting_planet and world.has_snapshot():
             snapshot = world.get_sale_snapshot(self.name)
-            return snapshot["currentPrice"]
+            return snapshot.current_price
 
-        return self.__best_price(world, skill, "sale")
-    
+        return float(self.data_loader.price_table().sale_prices(world, skill)[self.index])
+
+class PriceTable:
+    # Trade good rules compiled into goods x trade code arrays, prices for a world come out for every good at once
+    def __init__(self, trade_goods_data, data_loader) -> None:
+        codes = set()
+
+        for data in trade_goods_data:
+            codes.update(data["purchaseModifier"])
+            codes.update(data["saleModifier"])
+
+            if data["availability"] != "All":
+                codes.update(data["availability"])
+
+        self.__codes = {code: i for i, code in enumerate(sorted(codes))}
+        goods = len(trade_goods_data)
+        shape = (goods, len(self.__codes))
+
+        self.names = [data["name"] for data in trade_goods_data]
+        self.__purchase_modifiers = np.full(shape, -np.inf)
+        self.__sale_modifiers = np.full(shape, -np.inf)
+        self.__availability = np.zeros(shape, dtype=bool)
+        self.__available_everywhere = np.zeros(goods, dtype=bool)
+        self.__base_price = np.full(goods, np.nan)
+        self.__tons_dice = np.full(goods, np.nan)
+        self.__tons_multiplier = np.full(goods, np.nan)
+        self.__max_law_level = np.full(goods, np.inf)
+
+        for i, data in enumerate(trade_goods_data):
+            for code, modifier in data["purchaseModifier"].items():
+                self.__purchase_modifiers[i, self.__codes[code]] = modifier
+
+            for code, modifier in data["saleModifier"].items():
+                self.__sale_modifiers[i, self.__codes[code]] = modifier
+
+            if data["availability"] == "All":
+                self.__available_everywhere[i] = True
+            else:
+                for code in data["availability"]:
+                    self.__availability[i, self.__codes[code]] = True
+
+            # Special goods such as Exotics have no numeric price or tonnage and are never traded
+            if isinstance(data["basePrice"], (int, float)):
+                self.__base_price[i] = data["basePrice"]
+                self.__tons_dice[i] = data["tonsDice"]
+                self.__tons_multiplier[i] = data["tonsMultiplier"]
+
+            if data["maxLawLevel"] is not None:
+                self.__max_law_level[i] = data["maxLawLevel"]
+
+        self.__min_roll = -3
+        rolls = range(self.__min_roll, 26)
+        self.__modified_price = {
+            "purchase": np.array([data_loader.modified_price(roll, "purchase") for roll in rolls], dtype=float),
+            "sale": np.array([data_loader.modified_price(roll, "sale") for roll in rolls], dtype=float),
+        }
+
+        self.__masks = dict()
+        self.__available = dict()
+        self.__tons = dict()
+        self.__legal = dict()
+        self.__modifiers = dict()
+        self.__prices = dict()
+
+    def trade_code_mask(self, world):
+        mask = self.__masks.get(world.id)
+
+        if mask is None:
+            mask = np.zeros(len(self.__codes), dtype=bool)
+
+            for remark in world.remarks:
+                if remark in self.__codes:
+                    mask[self.__codes[remark]] = True
+
+            self.__masks[world.id] = mask
+
+        return mask
+
+    def is_available(self, world):
+        available = self.__available.get(world.id)
+
+        if available is None:
+            if world.size is None:
+                available = np.zeros(len(self.names), dtype=bool)
+            else:
+                available = self.__available_everywhere | self.__availability[:, self.trade_code_mask(world)].any(axis=1)
+
+            self.__available[world.id] = available
+
+        return available
+
+    def tons_available(self, world):
+        tons = self.__tons.get(world.id)
+
+        if tons is None:
+            tons = ((self.__tons_dice * AVERAGE_D6) + self.__tons_modifier(world)) * self.__tons_multiplier
+            self.__tons[world.id] = tons
+
+        return tons
+
+    @staticmethod
+    def __tons_modifier(world):
+        if world.population is not None and world.population <= 3:
+            return -3
+        elif world.population is not None and world.population >= 9:
+            return 3
+
+        return 0
+
+    def sample_tons(self, world, goods, rng, samples):
+        # Tons on sale of the given goods for each of samples rolls of their dice
+        dice = self.__tons_dice[goods].astype(int)
+        rolled = np.zeros((samples, len(goods)), dtype=np.int16)
+
+        for count in np.unique(dice):
+            columns = np.flatnonzero(dice == count)
+            rolled[:, columns] = roll_dice(rng, count, (samples, len(columns)))
 
-    def __best_price(self, world, skill, type):
-        best_modifier = None
-        modifiers = self.__purchase_modifier if type == "purchase" else self.__sale_modifier
+        return np.maximum(rolled + self.__tons_modifier(world), 0) * self.__tons_multiplier[goods]
 
-        for remark in world.remarks:
-            if remark in modifiers:
-                modifier = modifiers[remark]
+    def is_legal(self, world):
+        legal = self.__legal.get(world.id)
 
-                if best_modifier is None or best_modifier < modifier:
-                    best_modifier = modifier
+        if legal is None:
+            law = world.law if world.law is not None else np.nan
+            legal = ~(self.__max_law_level <= law)
+            self.__legal[world.id] = legal
+
+        return legal
+
+    def purchase_prices(self, world, skill):
+        return self.__best_prices(world, skill, "purchase")
+
+    def sale_prices(self, world, skill):
+        return self.__best_prices(world, skill, "sale")
+
+    def __best_modifier(self, world, type):
+        key = (world.id, type)
+        best_modifier = self.__modifiers.get(key)
 
         if best_modifier is None:
-            best_modifier = 0
+            modifiers = self.__purchase_modifiers if type == "purchase" else self.__sale_modifiers
+            best_modifier = modifiers[:, self.trade_code_mask(world)].max(axis=1, initial=-np.inf)
+            best_modifier[best_modifier == -np.inf] = 0
+            self.__modifiers[key] = best_modifier
+
+        return best_modifier
+
+    def __best_prices(self, world, skill, type):
+        key = (world.id, skill, type)
+        prices = self.__prices.get(key)
+
+        if prices is None:
+            prices = self.__prices[key] = self.__price(self.__best_modifier(world, type), skill, type)
+
+        return prices
 
+    def __price(self, best_modifier, skill, type):
         roll = best_modifier + skill + (3 * AVERAGE_D6)
+        table = self.__modified_price[type]
+        last = len(table) - 1
 
-        lower = self.data_loader.modified_price(math.floor(roll), type)
-        upper = self.data_loader.modified_price(math.ceil(roll), type)
+        lower = table[np.clip(np.floor(roll).astype(int) - self.__min_roll, 0, last)]
+        upper = table[np.clip(np.ceil(roll).astype(int) - self.__min_roll, 0, last)]
 
         factor = (lower + upper) / 2
         return factor * self.__base_price / 100
 
-class World:
-    def __init__(self, data, data_loader) -> None:
-        uwp = data["UWP"]
-        self.starport = uwp[0]
-        self.size = self.__parse_hex(uwp[1])
-        self.atmosphere = self.__parse_hex(uwp[2])
-        self.hydrographics = self.__parse_hex(uwp[3])
-        self.population = self.__parse_hex(uwp[4])
-        self.government = self.__parse_hex(uwp[5])
-        self.law = self.__parse_hex(uwp[6])
-        self.tech = self.__parse_hex(uwp[8])
-        self.sector_hex = SectorHex(data["Sector"], data["Hex"])
-        self.name = data["Name"]
-        self.x = int(data["WorldX"])
-        self.y = int(data["WorldY"])
-        self.zone = data["Zone"]
-        self.data_loader = data_loader
-        self.__neighbours = None
-        self.allegiance = data["Allegiance"]
-        self.__trade_snapshot = None
+    def sample_prices(self, world, goods, skill, type, rng, samples):
+        # Prices of the given goods for each of samples rolls of 3D6, one row per sample
+        roll = self.__best_modifier(world, type)[goods].astype(int) + skill + roll_dice(rng, 3, (samples, len(goods)))
+        table = self.__modified_price[type]
+        return table[np.clip(roll - self.__min_roll, 0, len(table) - 1)] * self.__base_price[goods] / 100
+
+    def tradeable(self, world, other_world):
+        # Goods that could be bought on world and sold on other_world whatever the prices turn out to be
+        return self.is_available(world) & self.is_legal(world) & self.is_legal(other_world) & ~np.isnan(self.__base_price)
+
+    def price_ceilings(self, skill):
+        # Lowest purchase and highest sale price of every good on any world, a larger modifier always gives a better price
+        key = (None, skill, "ceilings")
+        ceilings = self.__prices.get(key)
+
+        if ceilings is None:
+            purchase_modifier = np.maximum(self.__purchase_modifiers.max(axis=1), 0)
+            sale_modifier = np.maximum(self.__sale_modifiers.max(axis=1), 0)
+            ceilings = self.__prices[key] = (self.__price(purchase_modifier, skill, "purchase"), self.__price(sale_modifier, skill, "sale"))
+
+        return ceilings
+
+    def leg_margins(self, world, neighbours, skill):
+        # Most each ton bought on this world could make when sold on any of the neighbours, with its purchase price and tonnage
+        purchase_prices = self.purchase_prices(world, skill)
+        best_sale = np.full(len(self.names), -np.inf)
+
+        for other_world in neighbours:
+            best_sale = np.maximum(best_sale, np.where(self.is_legal(other_world), self.sale_prices(other_world, skill), -np.inf))
+
+        tradeable = self.is_available(world) & self.is_legal(world) & ~np.isnan(purchase_prices) & (best_sale > -np.inf)
+        return best_sale[tradeable] - purchase_prices[tradeable], purchase_prices[tradeable], self.tons_available(world)[tradeable]
+
+    def global_margins(self, skill):
+        # The same for a good bought and sold at the best prices any world could have
+        purchase_floor, sale_ceiling = self.price_ceilings(skill)
+        tradeable = ~np.isnan(purchase_floor)
+        tons_ceiling = ((self.__tons_dice * AVERAGE_D6) + 3) * self.__tons_multiplier
+        return sale_ceiling[tradeable] - purchase_floor[tradeable], purchase_floor[tradeable], tons_ceiling[tradeable]
+
+    def snapshot_purchases(self, snapshot):
+        # Availability, purchase price and tonnage of every good from a Traveller Tools snapshot
+        available = np.zeros(len(self.names), dtype=bool)
+        purchase_prices = np.full(len(self.names), np.nan)
+        tons = np.zeros(len(self.names))
+
+        for i, name in enumerate(self.names):
+            item = snapshot.purchase(name)
+
+            if item is not None:
+                available[i] = item.tons != 0
+                purchase_prices[i] = item.current_price
+                tons[i] = item.tons
+
+        return available, purchase_prices, tons
+
+class SnapshotGood:
+    def __init__(self, data) -> None:
+        self.name = data["type"]
+        self.tons = data.get("tons")
+        self.current_price = data["currentPrice"]
+
+class FreightLot:
+    def __init__(self, data) -> None:
+        self.tons = data["tons"]
+        self.contents = data["contents"]
+
+    def __str__(self) -> str:
+        return f"{self.tons}x {self.contents}"
+
+class TradeSnapshot:
+    # Traveller Tools snapshot indexed by good and destination name
+    def __init__(self, data) -> None:
+        self.__purchases = dict()
+        self.__sales = dict()
 
-        self.remarks = data["Remarks"].split()
+        for item in data["availableTradeGoods"]:
+            self.__purchases.setdefault(item["type"], SnapshotGood(item))
+
+        for item in data["desiredGoods"]:
+            self.__sales.setdefault(item["type"], SnapshotGood(item))
+
+        self.__passengers = {name: planet["passengers"] for name, planet in data["planets"].items()}
+        self.__freight = {name: [FreightLot(item) for item in planet["freight"]] for name, planet in data["planets"].items()}
+        self.__freight_tons = {name: [lot.tons for lot in lots] for name, lots in self.__freight.items()}
+        self.__best_freight = dict()
+        self.__purchase_arrays = None
+
+    def purchase(self, good):
+        return self.__purchases.get(good)
+
+    def sale(self, good):
+        return self.__sales.get(good)
+
+    def passenger_count(self, planet, level):
+        return self.__passengers[planet][level]
+
+    def freight(self, planet):
+        return self.__freight[planet]
+
+    def best_freight(self, planet, cargo):
+        key = (planet, cargo)
+
+        if key not in self.__best_freight:
+            freight = self.__freight[planet]
+            freight = [freight[i] for i in best_freight_lots(self.__freight_tons[planet], cargo)]
+            self.__best_freight[key] = (sum(lot.tons for lot in freight), ",".join(str(lot) for lot in freight))
+
+        return self.__best_freight[key]
+
+    def purchase_arrays(self, price_table):
+        if self.__purchase_arrays is None:
+            self.__purchase_arrays = price_table.snapshot_purchases(self)
+
+        return self.__purchase_arrays
+
+class WorldTable:
+    # Worlds interned to integer ids with every field held in a compact array indexed by id, a World is a view onto one row
+    UWP_FIELDS = 7
+
+    def __init__(self) -> None:
+        self.__ids = dict()
+        self.__strings = []
+        self.__string_ids = dict()
+        self.__remark_bits = dict()
+        self.__remark_names = []
+
+        self.sector_hexes = []
+        self.names = []
+        self.starports = array("B")
+        self.uwp = array("b")
+        self.x = array("i")
+        self.y = array("i")
+        self.zones = array("H")
+        self.allegiances = array("H")
+        self.trade_codes = []
+
+    def __len__(self):
+        return len(self.names)
 
     @staticmethod
     def __parse_hex(hex):
         if hex == "?":
-            return None
-        
+            return -1
+
         return int(hex, 18)
 
+    def __intern_string(self, text):
+        string_id = self.__string_ids.get(text)
+
+        if string_id is None:
+            string_id = self.__string_ids[text] = len(self.__strings)
+            self.__strings.append(text)
+
+        return string_id
+
+    def id(self, sector, hex):
+        return self.__ids.get((sector.lower(), hex))
+
+    def intern(self, data):
+        key = (data["Sector"].lower(), data["Hex"])
+        world_id = self.__ids.get(key)
+
+        if world_id is not None:
+            return world_id
+
+        world_id = self.__ids[key] = len(self.names)
+        uwp = data["UWP"]
+        trade_codes = 0
+
+        for remark in data["Remarks"].split():
+            bit = self.__remark_bits.get(remark)
+
+            if bit is None:
+                bit = self.__remark_bits[remark] = len(self.__remark_names)
+                self.__remark_names.append(remark)
+
+            trade_codes |= 1 << bit
+
+        self.sector_hexes.append(SectorHex(data["Sector"], data["Hex"]))
+        self.names.append(data["Name"])
+        self.starports.append(ord(uwp[0]))
+        self.uwp.extend(self.__parse_hex(uwp[i]) for i in (1, 2, 3, 4, 5, 6, 8))
+        self.x.append(int(data["WorldX"]))
+        self.y.append(int(data["WorldY"]))
+        self.zones.append(self.__intern_string(data["Zone"]))
+        self.allegiances.append(self.__intern_string(data["Allegiance"]))
+        self.trade_codes.append(trade_codes)
+        return world_id
+
+    def uwp_value(self, world_id, field):
+        value = self.uwp[world_id * self.UWP_FIELDS + field]
+        return None if value < 0 else value
+
+    def string(self, string_id):
+        return self.__strings[string_id]
+
+    def remark_mask(self, remarks):
+        mask = 0
+
+        for remark in remarks:
+            bit = self.__remark_bits.get(remark)
+
+            if bit is not None:
+                mask |= 1 << bit
+
+        return mask
+
+    def remarks(self, world_id):
+        trade_codes = self.trade_codes[world_id]
+        return [remark for bit, remark in enumerate(self.__remark_names) if trade_codes >> bit & 1]
+
+class World:
+    # A view onto one row of the loader's WorldTable, plus the neighbourhood and snapshot that are filled in while planning
+    __slots__ = ("id", "table", "sector_hex", "data_loader", "__neighbours", "__trade_snapshot", "__distances", "__neighbour_distances", "__passenger_demand")
+
+    def __init__(self, world_id, data_loader) -> None:
+        self.id = world_id
+        self.table = data_loader.world_table()
+        self.sector_hex = self.table.sector_hexes[world_id]
+        self.data_loader = data_loader
+        self.__neighbours = None
+        self.__trade_snapshot = None
+        self.__distances = dict()
+        self.__neighbour_distances = None
+        self.__passenger_demand = dict()
+
+    @property
+    def name(self):
+        return self.table.names[self.id]
+
+    @property
+    def starport(self):
+        return chr(self.table.starports[self.id])
+
+    @property
+    def size(self):
+        return self.table.uwp_value(self.id, 0)
+
+    @property
+    def atmosphere(self):
+        return self.table.uwp_value(self.id, 1)
+
+    @property
+    def hydrographics(self):
+        return self.table.uwp_value(self.id, 2)
+
+    @property
+    def population(self):
+        return self.table.uwp_value(self.id, 3)
+
+    @property
+    def government(self):
+        return self.table.uwp_value(self.id, 4)
+
+    @property
+    def law(self):
+        return self.table.uwp_value(self.id, 5)
+
+    @property
+    def tech(self):
+        return self.table.uwp_value(self.id, 6)
+
+    @property
+    def x(self):
+        return self.table.x[self.id]
+
+    @property
+    def y(self):
+        return self.table.y[self.id]
+
+    @property
+    def zone(self):
+        return self.table.string(self.table.zones[self.id])
+
+    @property
+    def allegiance(self):
+        return self.table.string(self.table.allegiances[self.id])
+
+    @property
+    def remarks(self):
+        return self.table.remarks(self.id)
+
     def __eq__(self, other):
-        return self.sector_hex == other.sector_hex
+        if not isinstance(other, World):
+            return NotImplemented
+
+        return self.id == other.id and self.table is other.table
     
     def __hash__(self) -> int:
-        return hash(self.sector_hex)
+        return self.id
     
     def __str__(self) -> str:
         return self.sector_hex.__str__()
@@ -167,42 +616,23 @@ class World:
         return self.sector_hex.__repr__()
     
     def set_trade_snapshot(self, snapshot):
+        if snapshot is not None and not isinstance(snapshot, TradeSnapshot):
+            snapshot = TradeSnapshot(snapshot)
+
         self.__trade_snapshot = snapshot
+        self.data_loader.leg_cache().invalidate(self)
 
     def get_sale_snapshot(self, good):
         if self.__trade_snapshot is None:
             return None
 
-        for item in self.__trade_snapshot["desiredGoods"]:
-            if item["type"] == good:
-                return item
-        
-        return None
+        return self.__trade_snapshot.sale(good)
     
     def freight_snapshot(self, other_world, cargo):
         if not self.has_snapshot():
             return None, None
-        
-        problem = pulp.LpProblem('Freight', pulp.LpMaximize)
-        total = 0
-        vars = []
-
-        freight = self.__trade_snapshot["planets"][other_world.name]["freight"]
-        i = 0
-
-        for item in freight:
-            i+= 1
-            variable = pulp.LpVariable(f"x{i}", cat="Binary")
-            total += item["tons"] * variable
-            vars.append(variable)
-
-        problem += total <= cargo
-        problem += total
-        problem.solve(pulp.PULP_CBC_CMD(msg=False))
-
-        freight = [freight[i] for i, variable in enumerate(vars) if pulp.value(variable) == 1]
-        freight = [f"{item['tons']}x {item["contents"]}" for item in freight]
-        return pulp.value(total), ",".join(freight)
+
+        return self.__trade_snapshot.best_freight(other_world.name, cargo)
     
     def has_snapshot(self):
         return self.__trade_snapshot is not None
@@ -211,11 +641,7 @@ class World:
         if self.__trade_snapshot is None:
             return None
         
-        for item in self.__trade_snapshot["availableTradeGoods"]:
-            if item["type"] == good:
-                return item
-        
-        return None
+        return self.__trade_snapshot.purchase(good)
 
     @property
     def neighbours(self):
@@ -224,16 +650,58 @@ class World:
 
         return self.__neighbours
     
+    def has_neighbours(self):
+        return self.__neighbours is not None
+
     @neighbours.setter
     def neighbours(self, neighbours):
         self.__neighbours = neighbours
+        self.__neighbour_distances = None
+
+    def neighbour_distances(self):
+        # (world, distance) for each neighbour, worked out once per neighbourhood
+        if self.__neighbour_distances is None:
+            self.__neighbour_distances = [(world, self.distance(world)) for world in self.neighbours]
+
+        return self.__neighbour_distances
 
     def __passenger_count(self, level, ship, other_world, starting_world):
-        distance = self.distance(other_world)
+        if starting_world and self.has_snapshot():
+            return self.__trade_snapshot.passenger_count(other_world.name, level)
+
+        return self.__demand(level, ship, other_world)[1]
+
+    def __demand(self, level, ship, other_world):
+        # Passenger modifier and average passengers for a level of passage to other_world, worked out once per world pair, level and steward skill
+        key = (other_world.id, level, ship.max_steward)
+        demand = self.__passenger_demand.get(key)
+
+        if demand is None:
+            modifier = self.__passenger_modifier(level, ship, other_world)
+            roll = modifier + 2 * AVERAGE_D6
+            # The Neu Bayern and Amondiage cold war modifier was only ever applied after the roll, so it never affected it
+            demand = self.__passenger_demand[key] = (modifier, self.data_loader.mean_passenger_count(roll))
+
+        return demand
 
+    def __sample_passenger_count(self, level, ship, other_world, starting_world, rng, samples):
         if starting_world and self.has_snapshot():
-            return self.__trade_snapshot["planets"][other_world.name]["passengers"][level]
+            return np.full(samples, float(self.__trade_snapshot.passenger_count(other_world.name, level)))
 
+        # Rolled the same way as __passenger_count
+        roll = self.__demand(level, ship, other_world)[0] + roll_dice(rng, 2, samples)
+        dice = self.data_loader.passenger_dice(roll)
+        passengers = np.zeros(samples)
+
+        for count in np.unique(dice):
+            if count > 0:
+                rows = np.flatnonzero(dice == count)
+                passengers[rows] = roll_dice(rng, count, len(rows))
+
+        return passengers
+
+    def __passenger_modifier(self, level, ship, other_world):
+        distance = self.distance(other_world)
         modifier = ship.max_steward
 
         if distance > 1:
@@ -267,29 +735,20 @@ class World:
             case "A":
                 modifier += 1
 
-        roll = modifier + 2 * AVERAGE_D6
-
-        cold_war = (
-            (self.sector_hex in NEU_BAYERN and other_world.sector_hex in AMONDIAGE)
-            or
-            (self.sector_hex in AMONDIAGE and other_world.sector_hex in NEU_BAYERN)
-        )
-
-        if cold_war:
-            modifier -= 2
-
-        upper = self.data_loader.passenger_count(math.ceil(roll))
-        lower = self.data_loader.passenger_count(math.floor(roll))
-
-        return (upper + lower) /2
+        return modifier
 
         
     def distance(self, other_world):
-        x1 = self.x
-        y1 = self.y
-        x2 = other_world.x
-        y2 = other_world.y
-        return round((((x1 - x2) ** 2) + ((y1-y2) ** 2)) ** (1/2))
+        distance = self.__distances.get(other_world)
+
+        if distance is None:
+            x1 = self.x
+            y1 = self.y
+            x2 = other_world.x
+            y2 = other_world.y
+            distance = self.__distances[other_world] = round((((x1 - x2) ** 2) + ((y1-y2) ** 2)) ** (1/2))
+
+        return distance
     
     def passengers(self, other_world, ship, starting_world):
         distance = self.distance(other_world)
@@ -301,62 +760,90 @@ class World:
             passengers = min(self.__passenger_count(passage.type, ship, other_world, starting_world), passage.number)
             life_support = self.data_loader.life_support(passage.type) * distance / 4
             passenger_revenue += passengers * (ticket_price - life_support)
-            passage_descriptions.append(f"{passengers} {passage.type} at {ticket_price} with life support of {life_support}")
+            passage_descriptions.append(LogLine("{} {} at {} with life support of {}", passengers, passage.type, ticket_price, life_support))
 
             if passage.type == "middle" and passengers < passage.number:
                 passengers = min(self.__passenger_count("basic", ship, other_world, starting_world), (passage.number - passengers) * 2)
                 ticket_price = self.data_loader.passage("basic", distance)
                 passenger_revenue += passengers * ticket_price
-                passage_descriptions.append(f"{passengers} basic at {ticket_price}")
+                passage_descriptions.append(LogLine("{} basic at {}", passengers, ticket_price))
 
-        return passenger_revenue, f"Took on passengers: {", ".join(passage_descriptions)}"
+        return passenger_revenue, LogLine("Took on passengers: {}", LogList(", ", passage_descriptions))
 
+    def sample_passengers(self, other_world, ship, starting_world, rng, samples):
+        # Passenger revenue for each of samples rolls of the passenger dice
+        distance = self.distance(other_world)
+        passenger_revenue = np.zeros(samples)
 
-    def best_trades(self, other_world, trade_goods, ship, capital, starting_planet):
+        for passage in ship.passage:
+            ticket_price = self.data_loader.passage(passage.type, distance)
+            passengers = np.minimum(self.__sample_passenger_count(passage.type, ship, other_world, starting_world, rng, samples), passage.number)
+            life_support = self.data_loader.life_support(passage.type) * distance / 4
+            passenger_revenue += passengers * (ticket_price - life_support)
+
+            if passage.type == "middle":
+                passengers = np.minimum(self.__sample_passenger_count("basic", ship, other_world, starting_world, rng, samples), (passage.number - passengers) * 2)
+                passenger_revenue += passengers * self.data_loader.passage("basic", distance)
+
+        return passenger_revenue
+
+
+    def trade_candidates(self, other_world, trade_goods, ship, starting_planet):
+        # Everything about a leg's trades that does not depend on capital
         distance = self.distance(other_world)
         cargo = ship.cargo_capacity(distance)
         freight_per_ton = self.data_loader.passage("freight", distance)
         
         if cargo is None:
-            return None, None, None
+            return None
 
-        deals = []
+        table = self.data_loader.price_table()
 
-        not_available = []
-        unaffordable = []
-        no_profit = []
-        illegal = []
+        if starting_planet and self.has_snapshot():
+            available, purchase_prices, tons = self.__trade_snapshot.purchase_arrays(table)
+        else:
+            available = table.is_available(self)
+            purchase_prices = table.purchase_prices(self, ship.max_broker)
+            tons = table.tons_available(self)
 
-        for trade_good in trade_goods:
-            if not trade_good.is_available(self, starting_planet):
-                not_available.append(trade_good.name)
-                continue
+        sale_prices = table.sale_prices(other_world, ship.max_broker)
 
-            if trade_good.is_illegal(self) or trade_good.is_illegal(other_world):
-                illegal.append(trade_good.name)
-                continue
+        with np.errstate(invalid="ignore"):
+            tradeable = available & table.is_legal(self) & table.is_legal(other_world) & (sale_prices - purchase_prices >= freight_per_ton)
 
-            purchase_price = trade_good.purchase_price(ship.max_broker, self, starting_planet)
+        candidates = []
 
-            if purchase_price > capital:
-                unaffordable.append(trade_good.name)
-                continue
+        for i in np.flatnonzero(tradeable):
+            if trade_goods[i].index != i:
+                raise Exception(f"Trade good {trade_goods[i].name} does not match the price table")
 
-            sale_price = trade_good.sale_price(ship.max_broker, other_world, False)
+            candidates.append((table.names[i], float(purchase_prices[i]), float(sale_prices[i]), min(cargo, float(tons[i]))))
 
-            if sale_price - purchase_price < freight_per_ton:
-                no_profit.append(f"{trade_good.name} ({sale_price} - {purchase_price})")
-                continue
+        return TradeCandidates(cargo, freight_per_ton, candidates)
+
+    def best_trades(self, other_world, trade_goods, ship, capital, starting_planet):
+        candidates = self.trade_candidates(other_world, trade_goods, ship, starting_planet)
 
-            available_tons = trade_good.tons_available(self, starting_planet)
+        if candidates is None:
+            return None, None, None
+
+        return self.execute_trades(other_world, candidates, capital, starting_planet)
+
+    def execute_trades(self, other_world, candidates, capital, starting_planet):
+        cargo = candidates.cargo
+        freight_per_ton = candidates.freight_per_ton
+        deals = []
+
+        for name, purchase_price, sale_price, available_tons in candidates.goods:
+            if purchase_price > capital:
+                continue
 
-            available_tons = min(cargo, available_tons)
             available_tons = min(capital/ purchase_price, available_tons)
 
             sort_value = available_tons * (sale_price - purchase_price) + ((cargo - available_tons) * freight_per_ton)
             actual_tons = math.floor(available_tons)
 
-            deals.append(Deal(trade_good.name, actual_tons, purchase_price, sale_price, sort_value))
+            deals.append(Deal(name, actual_tons, purchase_price, sale_price, sort_value))
 
         deals = sorted(deals, key=lambda x: x.sort_value, reverse=True)
 
@@ -373,7 +860,7 @@ class World:
             amount = min(amount, cargo)
             profit = amount * (deal.sale_price - deal.purchase_price)
             if amount != 0:
-                executed_deals.append(f"Buy {amount} of {deal.trade_good} at {deal.purchase_price}, sell at {deal.sale_price}, total profit: {profit:,.2f}, capital: {final_capital:,.2f}->{final_capital + profit:,.2f}")
+                executed_deals.append(LogLine("Buy {} of {} at {}, sell at {}, total profit: {:,.2f}, capital: {:,.2f}->{:,.2f}", amount, deal.trade_good, deal.purchase_price, deal.sale_price, profit, final_capital, final_capital + profit))
                 final_capital += profit
                 cargo -= amount
                 capital -= amount * deal.purchase_price
@@ -383,20 +870,208 @@ class World:
 
             if starting_planet and self.has_snapshot():
                 tons, text = self.freight_snapshot(other_world, cargo)
-                executed_deals.append(f"Carrying the following Freight: {text}")
-                executed_deals.append(f"Remaining cargo is {cargo - tons}")
+                executed_deals.append(LogLine("Carrying the following Freight: {}", text))
+                executed_deals.append(LogLine("Remaining cargo is {}", cargo - tons))
                 cargo = tons
 
             freight_revenue = cargo * freight_per_ton
-            executed_deals.append(f"Do {cargo} tons of freight for {freight_revenue} capital: {final_capital:,.2f}->{final_capital + freight_revenue:,.2f}")
+            executed_deals.append(LogLine("Do {} tons of freight for {} capital: {:,.2f}->{:,.2f}", cargo, freight_revenue, final_capital, final_capital + freight_revenue))
             final_capital += freight_revenue
         else:
-            executed_deals.append("Cargo is full, no freight")
+            executed_deals.append(LogLine("Cargo is full, no freight"))
         
-        executed_deals.append(f"Cash after goods are purchased is {capital:,.2f}")
+        executed_deals.append(LogLine("Cash after goods are purchased is {:,.2f}", capital))
 
         return starting_capital, final_capital, executed_deals
 
+    def sample_trades(self, other_world, ship, capital, starting_planet, rng):
+        # trade_candidates and execute_trades for every sample at once, capital and the result hold one value per sample
+        distance = self.distance(other_world)
+        cargo = ship.cargo_capacity(distance)
+        freight_per_ton = self.data_loader.passage("freight", distance)
+        table = self.data_loader.price_table()
+        samples = len(capital)
+
+        if starting_planet and self.has_snapshot():
+            available, purchase_prices, tons = self.__trade_snapshot.purchase_arrays(table)
+            goods = np.flatnonzero(available & table.is_legal(self) & table.is_legal(other_world))
+            purchase_prices = purchase_prices[goods]
+            tons = tons[goods]
+        else:
+            goods = np.flatnonzero(table.tradeable(self, other_world))
+            purchase_prices = table.sample_prices(self, goods, ship.max_broker, "purchase", rng, samples)
+            tons = table.sample_tons(self, goods, rng, samples)
+
+        sale_prices = table.sample_prices(other_world, goods, ship.max_broker, "sale", rng, samples)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            tradeable = sale_prices - purchase_prices >= freight_per_ton
+            purchase_prices = np.where(tradeable, purchase_prices, np.inf)
+            sale_prices = np.where(tradeable, sale_prices, 0)
+            tons = np.minimum(cargo, np.where(tradeable, tons, 0))
+
+            available_tons = np.minimum(capital[:, None] / purchase_prices, tons)
+            sort_value = available_tons * (sale_prices - purchase_prices) + ((cargo - available_tons) * freight_per_ton)
+            sort_value[~tradeable | (purchase_prices > capital[:, None])] = -np.inf
+
+        deal_tons = np.floor(available_tons)
+        order = np.argsort(-sort_value, axis=1, kind="stable")
+        rows = np.arange(samples)
+        final_capital = capital.copy()
+        remaining_capital = capital.copy()
+        remaining_cargo = np.full(samples, float(cargo))
+
+        for rank in range(order.shape[1]):
+            column = order[:, rank]
+            dealt = (sort_value[rows, column] > -np.inf) & (remaining_cargo > 0)
+
+            if not dealt.any():
+                break
+
+            purchase_price = np.where(dealt, purchase_prices[rows, column], 1)
+            dealt &= remaining_capital >= purchase_price
+            amount = np.minimum(np.minimum(np.floor(remaining_capital / purchase_price), deal_tons[rows, column]), remaining_cargo)
+            amount = np.where(dealt, amount, 0)
+            final_capital += amount * (sale_prices[rows, column] - purchase_price)
+            remaining_cargo -= amount
+            remaining_capital -= amount * purchase_price
+
+        freight_tons = remaining_cargo
+
+        if starting_planet and self.has_snapshot():
+            freight_tons = np.zeros(samples)
+
+            for value in np.unique(remaining_cargo):
+                freight_tons[remaining_cargo == value] = self.freight_snapshot(other_world, float(value))[0]
+
+        return final_capital + freight_tons * freight_per_ton
+
+class TradeCandidates:
+    def __init__(self, cargo, freight_per_ton, goods) -> None:
+        self.cargo = cargo
+        self.freight_per_ton = freight_per_ton
+        self.goods = goods
+
+        # Above this much capital every good is affordable in full, so the leg profit no longer depends on capital
+        self.saturation_capital = sum(purchase_price * math.ceil(tons) for _, purchase_price, _, tons in goods)
+        self.saturation_capital += max((purchase_price for _, purchase_price, _, _ in goods), default=0)
+        self.saturated_profit = None
+
+class LegCache:
+    # Passenger revenue and trade candidates only depend on the two worlds, the ship and whether the snapshot is used
+    def __init__(self) -> None:
+        self.__legs = dict()
+        self.passenger_hits = 0
+        self.passenger_misses = 0
+        self.trade_hits = 0
+        self.trade_misses = 0
+        self.saturated_hits = 0
+        # A CallTimer while a traced search is running
+        self.timer = None
+
+    def __timed(self, name, function, *args):
+        return function(*args) if self.timer is None else self.timer.call(name, function, *args)
+
+    def __leg(self, world, other_world, ship, starting_world):
+        legs = self.__legs.get(world.id)
+
+        if legs is None:
+            legs = self.__legs[world.id] = dict()
+
+        key = (other_world.id, ship.config(), starting_world and world.has_snapshot())
+        leg = legs.get(key)
+
+        if leg is None:
+            leg = legs[key] = [None, None]
+
+        return leg
+
+    def invalidate(self, world):
+        # Only legs that set off from the world with its snapshot depend on it
+        legs = self.__legs.get(world.id)
+
+        if legs is not None:
+            for key in [key for key in legs if key[2]]:
+                del legs[key]
+
+    def has(self, world, other_world, ship, starting_world):
+        return self.__leg(world, other_world, ship, starting_world)[1] is not None
+
+    def store(self, world, other_world, ship, starting_world, passengers, candidates):
+        # Legs evaluated elsewhere, such as a worker process, count as misses just as if they were computed here
+        leg = self.__leg(world, other_world, ship, starting_world)
+
+        if leg[0] is None:
+            self.passenger_misses += 1
+            leg[0] = passengers
+
+        if leg[1] is None:
+            self.trade_misses += 1
+            leg[1] = candidates or False
+
+    def passengers(self, world, other_world, ship, starting_world):
+        if self.timer is not None:
+            return self.timer.call("LegCache.passengers", self.__passengers, world, other_world, ship, starting_world)
+
+        return self.__passengers(world, other_world, ship, starting_world)
+
+    def __passengers(self, world, other_world, ship, starting_world):
+        leg = self.__leg(world, other_world, ship, starting_world)
+
+        if leg[0] is None:
+            self.passenger_misses += 1
+            leg[0] = self.__timed("World.passengers", world.passengers, other_world, ship, starting_world)
+        else:
+            self.passenger_hits += 1
+
+        return leg[0]
+
+    def final_capital(self, world, other_world, trade_goods, ship, capital, starting_world):
+        if self.timer is not None:
+            return self.timer.call("LegCache.final_capital", self.__final_capital, world, other_world, trade_goods, ship, capital, starting_world)
+
+        return self.__final_capital(world, other_world, trade_goods, ship, capital, starting_world)
+
+    def __final_capital(self, world, other_world, trade_goods, ship, capital, starting_world):
+        leg = self.__leg(world, other_world, ship, starting_world)
+
+        if leg[1] is None:
+            self.trade_misses += 1
+            leg[1] = self.__timed("World.trade_candidates", world.trade_candidates, other_world, trade_goods, ship, starting_world) or False
+        else:
+            self.trade_hits += 1
+
+        candidates = leg[1]
+
+        if candidates is False:
+            return None
+
+        if capital < candidates.saturation_capital:
+            return self.__timed("World.execute_trades", world.execute_trades, other_world, candidates, capital, starting_world)[1]
+
+        if candidates.saturated_profit is None:
+            saturation_capital = candidates.saturation_capital
+            candidates.saturated_profit = self.__timed("World.execute_trades", world.execute_trades, other_world, candidates, saturation_capital, starting_world)[1] - saturation_capital
+        else:
+            self.saturated_hits += 1
+
+        return capital + candidates.saturated_profit
+
+    def counters(self):
+        # (hits, misses) of each cache, trades misses are candidates worked out and saturated hits profits reused regardless of capital
+        return {
+            "passengers": (self.passenger_hits, self.passenger_misses),
+            "trades": (self.trade_hits, self.trade_misses),
+            "capital independent profit": (self.saturated_hits, self.trade_hits + self.trade_misses - self.saturated_hits),
+        }
+
+    def __str__(self) -> str:
+        def rate(hits, total):
+            return f"{hits / total:.1%}" if total else "n/a"
+
+        trades = self.trade_hits + self.trade_misses
+        return f"Leg cache hit rates: passengers {rate(self.passenger_hits, self.passenger_hits + self.passenger_misses)}, trades {rate(self.trade_hits, trades)}, capital independent profit {rate(self.saturated_hits, trades)}"
+
 MORTGAGE_PAID = "mortgage_paid"
 
 class Mortgage:
@@ -420,6 +1095,9 @@ class Mortgage:
     
     def profit_cut(self, *argv):
         return None, None
+
+    def profit_cuts(self, *argv):
+        return 0
     
     def monthly_income(self):
         return 0
@@ -427,6 +1105,9 @@ class Mortgage:
     def current_cut(self, _):
         return 0
 
+    def kept_profit_share(self):
+        return 1
+
 class Ship:
     def __init__(self, monthly_maint, fuel_per_jump, max_jump, fuel_tank, cargo, cargo_fuel, passage, contract, max_steward, max_broker, banned_allegiances =[]) -> None:
         self.monthly_maint = monthly_maint
@@ -440,6 +1121,10 @@ class Ship:
         self.max_steward = max_steward
         self.max_broker = max_broker
         self.banned_allegiances = banned_allegiances
+        self.__config = (monthly_maint, fuel_per_jump, max_jump, fuel_tank, cargo, cargo_fuel, tuple((p.type, p.number) for p in passage), max_steward, max_broker)
+
+    def config(self):
+        return self.__config
 
     def monthly_life_support(self, data_loader):
         life_support = 0
@@ -476,17 +1161,24 @@ class Ship:
         return distance * self.__fuel_per_jump * 100
     
 class SectorHex:
+    __slots__ = ("hex", "sector", "hex_x", "hex_y", "__hash")
+
     def __init__(self, sector, hex) -> None:
         self.hex = hex
         self.sector = sector.lower()
         self.hex_x = int(hex[0:2])
         self.hex_y = int(hex[2:4])
+        self.__hash = hash((self.sector, hex))
+
+    def __reduce__(self):
+        # String hashes differ between processes so the cached hash is worked out again rather than pickled
+        return (SectorHex, (self.sector, self.hex))
 
     def __eq__(self, other):
         return self.hex == other.hex and self.sector == other.sector
     
     def __hash__(self) -> int:
-        return hash(self.__str__())
+        return self.__hash
     
     def __str__(self) -> str:
         return f"{self.sector}-{self.hex}"
@@ -494,324 +1186,2297 @@ class SectorHex:
     def __repr__(self) -> str:
         return self.__str__()
 
-    def distance(self, other):
-        if self.sector != other.sector:
-            raise Exception(f"Unable to get distance between hexes in different sectors, {self} and {other}")
+    def distance(self, other):
+        if self.sector != other.sector:
+            raise Exception(f"Unable to get distance between hexes in different sectors, {self} and {other}")
+
+        x1 = self.hex_x
+        y1 = self.hex_y
+        x2 = other.hex_x
+        y2 = other.hex_y
+        return round((((x1 - x2) ** 2) + ((y1-y2) ** 2)) ** (1/2))
+
+NEU_BAYERN = [SectorHex("Reft", "1822"), SectorHex("Reft", "1923")]
+AMONDIAGE = [SectorHex("Reft", "2325"), SectorHex("Reft", "2225")]
+
+SECTOR_WIDTH = 32
+SECTOR_HEIGHT = 40
+
+def hex_distance(x1, y1, x2, y2):
+    # World coordinates are columns of hexes with odd columns shifted half a hex rimward
+    q1 = x1
+    r1 = y1 - (x1 - (x1 & 1)) // 2
+    q2 = x2
+    r2 = y2 - (x2 - (x2 & 1)) // 2
+    return max(abs(q1 - q2), abs(r1 - r2), abs(q1 - q2 + r1 - r2))
+
+class HexGridIndex:
+    # Worlds bucketed into square blocks of parsecs so a range query only looks at the blocks it overlaps
+    def __init__(self, bucket_size=8) -> None:
+        self.__bucket_size = bucket_size
+        self.__buckets = dict()
+
+    def add(self, x, y, item):
+        key = (x // self.__bucket_size, y // self.__bucket_size)
+        self.__buckets.setdefault(key, []).append((x, y, item))
+
+    def within(self, x, y, distance):
+        size = self.__bucket_size
+        found = []
+
+        for bucket_x in range((x - distance) // size, (x + distance) // size + 1):
+            for bucket_y in range((y - distance) // size, (y + distance) // size + 1):
+                for item_x, item_y, item in self.__buckets.get((bucket_x, bucket_y), ()):
+                    if hex_distance(x, y, item_x, item_y) <= distance:
+                        found.append((item_x, item_y, item))
+
+        found.sort(key=lambda entry: (entry[0], entry[1]))
+        return [item for _, _, item in found]
+
+class SectorStore:
+    # Whole sectors are ingested once and jump neighbourhoods are worked out locally rather than asked of travellermap per hex
+    def __init__(self, cache_dir="cache/sectors") -> None:
+        self.__cache_dir = cache_dir
+        self.__sectors = dict()
+        self.__worlds = dict()
+        self.__positions = dict()
+        self.__index = HexGridIndex()
+
+    def has_sector(self, sector):
+        return sector.lower() in self.__sectors
+
+    def load_sector(self, sector):
+        # Reads the sector from the local cache or fetches it from travellermap in two requests
+        if self.has_sector(sector):
+            return
+
+        file_name = f"{self.__cache_dir}/{sector.lower()}.json"
+
+        if not os.path.isfile(file_name):
+            coordinates = requests.get(f'https://travellermap.com/api/coordinates?sector={sector}').json()
+            data = requests.get(f'https://travellermap.com/api/sec?sector={sector}&type=TabDelimited').text
+            self.ingest_tab_delimited(data, sector, coordinates["sx"], coordinates["sy"])
+            self.save_sector(sector)
+            return
+
+        self.load_sector_file(file_name)
+
+    def load_sector_file(self, file_name, sector=None, sx=None, sy=None):
+        # Accepts a saved sector, a recorded jumpworlds style dump or a tab delimited sector file
+        with open(file_name, 'r') as file:
+            text = file.read()
+
+        if not text.lstrip().startswith("{"):
+            if sector is None or sx is None or sy is None:
+                raise Exception(f"Sector name and coordinates are needed to load {file_name}")
+            self.ingest_tab_delimited(text, sector, sx, sy)
+            return
+
+        data = json.loads(text)
+        sector = sector or data.get("Sector")
+
+        if sector is None:
+            raise Exception(f"Sector name is needed to load {file_name}")
+
+        self.ingest_worlds(data["Worlds"], sector, data.get("X", sx), data.get("Y", sy))
+
+    def ingest_tab_delimited(self, text, sector, sx, sy):
+        lines = [line for line in text.splitlines() if line.strip() and not line.startswith("#")]
+        headers = lines[0].split("\t")
+        worlds = []
+
+        for line in lines[1:]:
+            row = dict(zip(headers, line.split("\t")))
+            hex = row["Hex"]
+            zone = row.get("Zone", "")
+            worlds.append({
+                "Name": row.get("Name", ""),
+                "Hex": hex,
+                "Sector": sector,
+                "UWP": row["UWP"],
+                "Remarks": row.get("Remarks", ""),
+                "Zone": "" if zone == "-" else zone,
+                "Allegiance": row.get("Allegiance", ""),
+                "WorldX": sx * SECTOR_WIDTH + int(hex[0:2]) - 1,
+                "WorldY": sy * SECTOR_HEIGHT + int(hex[2:4]) - SECTOR_HEIGHT,
+            })
+
+        self.ingest_worlds(worlds, sector, sx, sy)
+
+    def ingest_worlds(self, worlds, sector, sx=None, sy=None):
+        if (sx is None or sy is None) and worlds:
+            # Recover the sector position from any world's coordinates
+            world = worlds[0]
+            sx = (int(world["WorldX"]) - int(world["Hex"][0:2]) + 1) // SECTOR_WIDTH
+            sy = (int(world["WorldY"]) - int(world["Hex"][2:4]) + SECTOR_HEIGHT) // SECTOR_HEIGHT
+
+        name = sector.lower()
+
+        if name in self.__sectors:
+            raise Exception(f"Sector {sector} is already loaded")
+
+        self.__sectors[name] = (sector, sx, sy)
+        self.__positions[(sx, sy)] = name
+        sector_worlds = self.__worlds[name] = dict()
+
+        for world in worlds:
+            world = dict(world, Sector=sector)
+            sector_worlds[world["Hex"]] = world
+            self.__index.add(int(world["WorldX"]), int(world["WorldY"]), world)
+
+    def save_sector(self, sector):
+        name, sx, sy = self.__sectors[sector.lower()]
+        Path(self.__cache_dir).mkdir(parents=True, exist_ok=True)
+
+        with open(f"{self.__cache_dir}/{name.lower()}.json", 'w') as file:
+            json.dump({"Sector": name, "X": sx, "Y": sy, "Worlds": list(self.__worlds[name.lower()].values())}, file)
+
+    def __coordinates(self, sector_hex):
+        _, sx, sy = self.__sectors[sector_hex.sector]
+        return sx * SECTOR_WIDTH + sector_hex.hex_x - 1, sy * SECTOR_HEIGHT + sector_hex.hex_y - SECTOR_HEIGHT
+
+    def covers(self, sector_hex, max_jump):
+        # True when every sector the jump neighbourhood reaches into is loaded
+        if sector_hex.sector not in self.__sectors:
+            return False
+
+        x, y = self.__coordinates(sector_hex)
+
+        for corner_x, corner_y in [(x - max_jump, y - max_jump), (x + max_jump, y + max_jump), (x - max_jump, y + max_jump), (x + max_jump, y - max_jump)]:
+            position = (corner_x // SECTOR_WIDTH, (corner_y + SECTOR_HEIGHT - 1) // SECTOR_HEIGHT)
+
+            if position not in self.__positions:
+                return False
+
+        return True
+
+    def jump_worlds(self, sector_hex, max_jump):
+        # Same shape as the jumpworlds API, or None when the neighbourhood reaches into a sector we do not have
+        if not self.covers(sector_hex, max_jump):
+            return None
+
+        x, y = self.__coordinates(sector_hex)
+        return {"Worlds": self.__index.within(x, y, max_jump)}
+
+class WorldDatabase:
+    # Every world is stored once with an ordered neighbour list per jump range, in one SQLite file several processes can share
+    def __init__(self, file_name="cache/worlds.sqlite") -> None:
+        self.__file_name = file_name
+        self.__connection = None
+        self.__pid = None
+        self.__lock = threading.Lock()
+
+    def __connect(self):
+        # A connection made before a fork is not used by the child
+        if self.__connection is None or self.__pid != os.getpid():
+            Path(self.__file_name).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.__file_name, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS worlds (sector TEXT NOT NULL, hex TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (sector, hex))")
+                connection.execute("CREATE TABLE IF NOT EXISTS jumps (sector TEXT NOT NULL, hex TEXT NOT NULL, max_jump INTEGER NOT NULL, PRIMARY KEY (sector, hex, max_jump))")
+                connection.execute("CREATE TABLE IF NOT EXISTS neighbours (sector TEXT NOT NULL, hex TEXT NOT NULL, max_jump INTEGER NOT NULL, position INTEGER NOT NULL, neighbour_sector TEXT NOT NULL, neighbour_hex TEXT NOT NULL, PRIMARY KEY (sector, hex, max_jump, position))")
+
+            self.__connection = connection
+            self.__pid = os.getpid()
+
+        return self.__connection
+
+    def close(self):
+        if self.__connection is not None and self.__pid == os.getpid():
+            self.__connection.close()
+
+        self.__connection = None
+
+    def save_jump_worlds(self, sector, hex, max_jump, jump_data):
+        sector = sector.lower()
+        worlds = jump_data["Worlds"]
+
+        with self.__lock:
+            connection = self.__connect()
+
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO worlds VALUES (?, ?, ?)", [(world["Sector"].lower(), world["Hex"], json.dumps(world)) for world in worlds])
+                connection.execute("DELETE FROM neighbours WHERE sector = ? AND hex = ? AND max_jump = ?", (sector, hex, max_jump))
+                connection.executemany("INSERT INTO neighbours VALUES (?, ?, ?, ?, ?, ?)", [(sector, hex, max_jump, position, world["Sector"].lower(), world["Hex"]) for position, world in enumerate(worlds)])
+                connection.execute("INSERT OR IGNORE INTO jumps VALUES (?, ?, ?)", (sector, hex, max_jump))
+
+    def has_jump_worlds(self, sector, hex, max_jump):
+        with self.__lock:
+            row = self.__connect().execute("SELECT 1 FROM jumps WHERE sector = ? AND hex = ? AND max_jump >= ? LIMIT 1", (sector.lower(), hex, max_jump)).fetchone()
+
+        return row is not None
+
+    def jump_worlds(self, sector, hex, max_jump):
+        # Same shape as the jumpworlds API, a neighbourhood saved for a longer jump is cut down to this one
+        sector = sector.lower()
+
+        with self.__lock:
+            connection = self.__connect()
+            row = connection.execute("SELECT max_jump FROM jumps WHERE sector = ? AND hex = ? AND max_jump >= ? ORDER BY max_jump LIMIT 1", (sector, hex, max_jump)).fetchone()
+
+            if row is None:
+                return None
+
+            rows = connection.execute(
+                "SELECT w.data FROM neighbours n JOIN worlds w ON w.sector = n.neighbour_sector AND w.hex = n.neighbour_hex "
+                "WHERE n.sector = ? AND n.hex = ? AND n.max_jump = ? ORDER BY n.position", (sector, hex, row[0])).fetchall()
+
+        worlds = [json.loads(data) for data, in rows]
+
+        if row[0] > max_jump:
+            centre = next(world for world in worlds if world["Sector"].lower() == sector and world["Hex"] == hex)
+            x, y = int(centre["WorldX"]), int(centre["WorldY"])
+            worlds = [world for world in worlds if hex_distance(x, y, int(world["WorldX"]), int(world["WorldY"])) <= max_jump]
+
+        return {"Worlds": worlds}
+
+    def load_all(self, max_jump):
+        # Every world record, and for each world the neighbour keys of the shortest saved jump range that is at least max_jump
+        with self.__lock:
+            connection = self.__connect()
+            worlds = [json.loads(data) for data, in connection.execute("SELECT data FROM worlds")]
+            rows = connection.execute(
+                "SELECT n.sector, n.hex, n.neighbour_sector, n.neighbour_hex FROM neighbours n "
+                "JOIN (SELECT sector, hex, MIN(max_jump) AS max_jump FROM jumps WHERE max_jump >= ? GROUP BY sector, hex) j "
+                "ON n.sector = j.sector AND n.hex = j.hex AND n.max_jump = j.max_jump ORDER BY n.sector, n.hex, n.position", (max_jump,)).fetchall()
+
+        neighbours = dict()
+
+        for sector, hex, neighbour_sector, neighbour_hex in rows:
+            neighbours.setdefault((sector, hex), []).append((neighbour_sector, neighbour_hex))
+
+        return worlds, neighbours
+
+class JumpDataPrefetcher:
+    # Fetches jumpworlds data on a background asyncio loop so the search can ask for worlds before it pops them
+    def __init__(self, base_url="https://travellermap.com", concurrency=4, requests_per_second=10) -> None:
+        self.__base_url = base_url
+        self.__interval = 1 / requests_per_second if requests_per_second else 0
+        self.__session = requests.Session()
+        self.__session.mount(base_url, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+        self.__futures = dict()
+        self.__lock = threading.Lock()
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, daemon=True)
+        self.__thread.start()
+        self.__semaphore = asyncio.run_coroutine_threadsafe(self.__create_semaphore(concurrency), self.__loop).result()
+        self.__next_request = 0
+        self.requests = 0
+
+    @staticmethod
+    async def __create_semaphore(concurrency):
+        # The semaphore has to be created on the loop that will use it
+        return asyncio.Semaphore(concurrency)
+
+    async def __wait_for_turn(self):
+        now = self.__loop.time()
+        start = max(now, self.__next_request)
+        self.__next_request = start + self.__interval
+
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __fetch(self, sector, hex, max_jump, save):
+        async with self.__semaphore:
+            await self.__wait_for_turn()
+            url = f'{self.__base_url}/api/jumpworlds?sector={sector}&hex={hex}&jump={max_jump}'
+            response = await asyncio.to_thread(self.__session.get, url)
+            response.raise_for_status()
+            jump_data = response.json()
+            self.requests += 1
+
+        save(jump_data)
+        return jump_data
+
+    def fetch(self, sector, hex, max_jump, save):
+        # Returns a future for the jump data, the same request is only made once however often it is asked for
+        key = (sector.lower(), hex, max_jump)
+
+        with self.__lock:
+            future = self.__futures.get(key)
+
+            # A fetch that failed is made again rather than handing its error to everyone that asks later
+            if future is not None and future.done() and not future.cancelled() and future.exception() is not None:
+                future = None
+
+            created = future is None
+
+            if created:
+                future = asyncio.run_coroutine_threadsafe(self.__fetch(sector, hex, max_jump, save), self.__loop)
+                self.__futures[key] = future
+
+        if created:
+            future.add_done_callback(functools.partial(self.__forget_failed, key))
+
+        return future
+
+    def __forget_failed(self, key, future):
+        if future.cancelled() or future.exception() is None:
+            return
+
+        with self.__lock:
+            if self.__futures.get(key) is future:
+                del self.__futures[key]
+
+    async def __shutdown(self):
+        # Speculative fetches nobody waited for are dropped rather than left pending on a stopped loop
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.__loop.shutdown_default_executor()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.__shutdown(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__session.close()
+
+class RuleTable:
+    # A table of the rules keyed by roll compiled to a list indexed by roll less the lowest roll, rolls past either end read the end row
+    def __init__(self, rows, column=None) -> None:
+        rolls = sorted(int(roll) for roll in rows)
+        self.low = rolls[0]
+        self.high = rolls[-1]
+
+        if rolls != list(range(self.low, self.high + 1)):
+            raise Exception("Rule table rolls are not consecutive")
+
+        self.values = [rows[str(roll)] if column is None else rows[str(roll)][column] for roll in rolls]
+        self.__means = [(lower + upper) / 2 for lower, upper in zip(self.values, self.values[1:])]
+
+    def value(self, roll):
+        if roll <= self.low:
+            return self.values[0]
+
+        if roll >= self.high:
+            return self.values[-1]
+
+        return self.values[roll - self.low]
+
+    def mean(self, roll):
+        # A fractional roll is the mean of the rows either side of it
+        if roll <= self.low:
+            return self.values[0]
+
+        if roll >= self.high:
+            return self.values[-1]
+
+        index = roll - self.low
+        row = int(index)
+
+        if row == index:
+            return self.values[row]
+
+        return self.__means[row]
+
+class DataLoader:
+    def __init__(self, max_jump, sector_store=None, prefetcher=None, cache_dir="cache", base_url="https://travellermap.com", world_database=None) -> None:
+        self.__world_table = WorldTable()
+        self.__worlds = []
+        self.__max_jump = max_jump
+        self.__sector_store = sector_store
+        self.__prefetcher = prefetcher
+        self.__world_database = world_database
+        self.__cache_dir = cache_dir
+        self.__base_url = base_url
+
+        self.__trade_goods_data = None
+        self.__trade_goods = None
+        self.__price_table = None
+        self.__passage_freight = None
+        self.__passenger_count = None
+        self.__passenger_dice = None
+        self.__modified_price = None
+        self.__life_support = None
+        self.__leg_cache = LegCache()
+
+    def __jump_worlds_file(self, sector, hex, max_jump):
+        return f"{self.__cache_dir}/{sector}-{hex}-{max_jump}.json"
+
+    def __save_jump_worlds(self, sector, hex, max_jump, jump_data):
+        if self.__world_database is not None:
+            self.__world_database.save_jump_worlds(sector, hex, max_jump, jump_data)
+            return
+
+        # Make sure cache dir exists
+        Path(self.__cache_dir).mkdir(parents=True, exist_ok=True)
+
+        # Written to a temporary file and moved into place so a search reading the cache never sees half a file from the prefetcher
+        file_name = self.__jump_worlds_file(sector, hex, max_jump)
+
+        with tempfile.NamedTemporaryFile('w', dir=self.__cache_dir, suffix=".tmp", delete=False) as f:
+            json.dump(jump_data, f)
+
+        os.replace(f.name, file_name)
+
+    def __has_jump_worlds(self, sector, hex, max_jump):
+        if self.__world_database is not None and self.__world_database.has_jump_worlds(sector, hex, max_jump):
+            return True
+
+        return os.path.isfile(self.__jump_worlds_file(sector, hex, max_jump))
+
+    def __jump_worlds(self, sector, hex, max_jump):
+        if self.__world_database is not None:
+            jump_data = self.__world_database.jump_worlds(sector, hex, max_jump)
+
+            if jump_data is not None:
+                return jump_data
+
+        file_name = self.__jump_worlds_file(sector, hex, max_jump)
+
+        if os.path.isfile(file_name):
+            with open(file_name, 'r') as file:
+                jump_data = json.load(file)
+
+            # Files from before the world database are moved into it as they are read, the file goes once the save has committed
+            if self.__world_database is not None:
+                self.__world_database.save_jump_worlds(sector, hex, max_jump, jump_data)
+                os.remove(file_name)
+
+            return jump_data
+
+        if self.__prefetcher is not None:
+            return self.__fetch_jump_worlds(sector, hex, max_jump).result()
+
+        r = requests.get(f'{self.__base_url}/api/jumpworlds?sector={sector}&hex={hex}&jump={max_jump}')
+        jump_data = r.json()
+        self.__save_jump_worlds(sector, hex, max_jump, jump_data)
+        return jump_data
+
+    def __fetch_jump_worlds(self, sector, hex, max_jump):
+        return self.__prefetcher.fetch(sector, hex, max_jump, lambda jump_data: self.__save_jump_worlds(sector, hex, max_jump, jump_data))
+
+    def world_table(self):
+        return self.__world_table
+
+    def world(self, world_id):
+        return self.__worlds[world_id]
+
+    def __world(self, raw_world_data):
+        world_id = self.__world_table.intern(raw_world_data)
+
+        if world_id == len(self.__worlds):
+            self.__worlds.append(World(world_id, self))
+
+        return self.__worlds[world_id]
+
+    def __cached_world(self, sector, hex):
+        world_id = self.__world_table.id(sector, hex)
+        return None if world_id is None else self.__worlds[world_id]
+
+    def warm_load(self):
+        # Builds every world and neighbourhood already in the world database in one pass instead of one query per world
+        if self.__world_database is None:
+            return
+
+        worlds, neighbours = self.__world_database.load_all(self.__max_jump)
+
+        for raw_world_data in worlds:
+            self.__world(raw_world_data)
+
+        for (sector, hex), keys in neighbours.items():
+            current_world = self.__cached_world(sector, hex)
+
+            if current_world.has_neighbours():
+                continue
+
+            other_worlds = [self.__cached_world(neighbour_sector, neighbour_hex) for neighbour_sector, neighbour_hex in keys]
+            current_world.neighbours = [world for world in other_worlds if world != current_world and hex_distance(current_world.x, current_world.y, world.x, world.y) <= self.__max_jump]
+
+    def load_world_data(self, sector_hex, force=False):
+        # Searches that are traced time loading through the leg cache's timer
+        timer = self.__leg_cache.timer
+
+        if timer is not None:
+            return timer.call("DataLoader.load_world_data", self.__load_world_data, sector_hex, force)
+
+        return self.__load_world_data(sector_hex, force)
+
+    def __load_world_data(self, sector_hex, force):
+        current_world = self.__cached_world(sector_hex.sector, sector_hex.hex)
+
+        if force or current_world is None:
+            jump_data = None
+
+            if self.__sector_store is not None:
+                jump_data = self.__sector_store.jump_worlds(sector_hex, self.__max_jump)
+
+            if jump_data is None:
+                jump_data = self.__jump_worlds(sector_hex.sector, sector_hex.hex, self.__max_jump)
+
+            other_worlds = []
+
+            for raw_world_data in jump_data["Worlds"]:
+                world = self.__world(raw_world_data)
+
+                if world.sector_hex == sector_hex:
+                    current_world = world
+                else:
+                    other_worlds.append(world)
+
+            current_world.neighbours = other_worlds
+
+        return current_world
+    
+    def prefetch(self, worlds):
+        # Starts loading the jump data of worlds the search is likely to expand soon
+        if self.__prefetcher is None:
+            return
+
+        timer = self.__leg_cache.timer
+
+        if timer is not None:
+            timer.call("DataLoader.prefetch", self.__prefetch, worlds)
+        else:
+            self.__prefetch(worlds)
+
+    def __prefetch(self, worlds):
+        for world in worlds:
+            sector_hex = world.sector_hex
+
+            if world.has_neighbours():
+                continue
+
+            if self.__sector_store is not None and self.__sector_store.covers(sector_hex, self.__max_jump):
+                continue
+
+            if not self.__has_jump_worlds(sector_hex.sector, sector_hex.hex, self.__max_jump):
+                self.__fetch_jump_worlds(sector_hex.sector, sector_hex.hex, self.__max_jump)
+
+    def leg_cache(self):
+        return self.__leg_cache
+
+    def __load_trade_goods_data(self):
+        if self.__trade_goods_data is None:
+            with open('tradeGoods.json', 'r') as file:
+                self.__trade_goods_data = json.load(file)
+
+        return self.__trade_goods_data
+
+    def trade_goods(self):
+        if self.__trade_goods is None:
+            self.__trade_goods = []
+            for index, tradeGoodRaw in enumerate(self.__load_trade_goods_data()):
+                self.__trade_goods.append(TradeGood(tradeGoodRaw, self, index))
+
+        return self.__trade_goods
+
+    def price_table(self):
+        if self.__price_table is None:
+            self.__price_table = PriceTable(self.__load_trade_goods_data(), self)
+
+        return self.__price_table
+    
+    def life_support(self, level):
+        if self.__life_support is None:
+            with open('lifeSupport.json', 'r') as file:
+                self.__life_support = json.load(file)
+
+        return self.__life_support[level]
+
+    def __rule_table(self, file_name, column=None):
+        with open(file_name, 'r') as file:
+            return RuleTable(json.load(file), column)
+
+    def passenger_count(self, roll):
+        return self.__passenger_count_table().value(roll) * AVERAGE_D6
+
+    def mean_passenger_count(self, roll):
+        # Passengers for a roll that may fall between two rows of the table
+        return self.__passenger_count_table().mean(roll) * AVERAGE_D6
+
+    def passenger_dice(self, rolls):
+        # How many D6 of passengers turn up for an array of rolls
+        if self.__passenger_dice is None:
+            table = self.__passenger_count_table()
+            self.__passenger_dice = np.array([table.value(roll) for roll in range(21)], dtype=int)
+
+        return self.__passenger_dice[np.clip(rolls, 0, 20)]
+
+    def __passenger_count_table(self):
+        if self.__passenger_count is None:
+            self.__passenger_count = self.__rule_table('passengerCount.json')
+
+        return self.__passenger_count
+
+    def modified_price(self, roll, type):
+        if self.__modified_price is None:
+            self.__modified_price = {type: self.__rule_table('modifiedPrice.json', type) for type in ("purchase", "sale")}
+
+        return self.__modified_price[type].value(roll)
+
+    def passage(self, type, distance):
+        if self.__passage_freight is None:
+            self.__passage_freight = {type: self.__rule_table('passageFreight.json', type) for type in ("high", "middle", "basic", "low", "freight")}
+
+        return self.__passage_freight[type].value(distance)
+    
+class CompleteCondition:
+    def __init__(self, destination=None, max_profit=None, max_duration=None) -> None:
+        self.destination= destination
+        self.max_profit = max_profit
+        self.max_duration = max_duration
+
+        if destination is None and max_profit is None and max_duration is None:
+            raise Exception("Complete condition is not finished")
+
+    def is_complete(self, world, total_duration, profit):
+        if self.destination and self.destination.sector_hex == world.sector_hex:
+            return True
+        
+        if self.max_profit is not None and profit >= self.max_profit:
+            return True
+        
+        if self.max_duration is not None and total_duration >= self.max_duration:
+            return True
+        
+        return False
+
+STARTING_NET_WORTH = "STARTING_NET_WORTH"
+
+# A world seen more than once in this many of a route's latest stops is not visited again
+RECENT_VISIT_WINDOW = 10
+
+class SearchContext:
+    def __init__(self, starting_capital, starting_net_worth, start, avoid, complete_condition, ship, data_loader, start_duration, dice=None) -> None:
+        self.starting_capital = starting_capital
+        self.starting_net_worth = starting_net_worth
+        self.start = start
+        self.avoid = avoid
+        self.avoid_ids = frozenset(world.id for world in avoid)
+        self.complete_condition = complete_condition
+        self.ship = ship
+        self.data_loader = data_loader
+        self.start_duration = start_duration
+        self.dice = dice
+
+class Route:
+    # Routes share their history through parent pointers and only hold the figures of their last leg
+    __slots__ = ("context", "parent", "world", "visited", "recent", "state", "profit", "route_duration", "total_duration", "complete", "dominated", "priority", "bound", "outcomes", "outcome_state", "depth", "__weakref__")
+
+    def __init__(self, context, world, parent=None, route_duration=0, state=dict(), profit=0, outcomes=None) -> None:
+        self.context = context
+        self.parent = parent
+        self.world = world
+        self.depth = 0 if parent is None else parent.depth + 1
+
+        # Capital and contract state for each simulated roll of the dice when the context has a DiceSimulator
+        self.outcomes, self.outcome_state = outcomes or (None, None)
+
+        self.visited = None
+        self.recent = None
+        self.profit = profit
+        self.complete = context.complete_condition.is_complete(world, route_duration, profit)
+        self.state = state
+        self.route_duration = route_duration
+        self.total_duration = route_duration + context.start_duration
+        self.dominated = False
+        self.priority = self.__priority()
+        self.bound = None
+
+    @property
+    def worlds(self):
+        worlds = []
+        route = self
+
+        while route is not None:
+            worlds.append(route.world)
+            route = route.parent
+
+        worlds.reverse()
+        return worlds
+
+    @property
+    def text(self):
+        routes = []
+        route = self
+
+        while route.parent is not None:
+            routes.append(route)
+            route = route.parent
+
+        log = []
+
+        for route in reversed(routes):
+            parent = route.parent
+            parent.__leg(route.world, parent.world.distance(route.world), log)
+
+        return [str(line) for line in log]
+
+    def __history(self):
+        # Bit n of visited is set when world n is on the route, recent holds the ids of the last few worlds.
+        # Only worked out for routes that are expanded as most routes never leave the frontier
+        if self.recent is None:
+            world_id = self.world.id
+
+            if self.parent is None:
+                self.visited = 1 << world_id
+                self.recent = (world_id,)
+            else:
+                visited, recent = self.parent.__history()
+                self.visited = visited | (1 << world_id)
+                self.recent = (recent + (world_id,))[-RECENT_VISIT_WINDOW:]
+
+        return self.visited, self.recent
+
+    def visits(self, world):
+        return (self.__history()[0] >> world.id) & 1 == 1
+
+    def recent_visits(self, world):
+        return self.__history()[1].count(world.id)
+
+    def generate_next_steps(self):
+        if self.complete:
+            return []
+
+        context = self.context
+        ship = context.ship
+        current_world = self.world
+        previous_world = self.parent.world if self.parent is not None and len(current_world.neighbours) > 2 else None
+        avoid_ids = context.avoid_ids
+        visited, recent = self.__history()
+
+        if not context.complete_condition.destination:
+            visited = 0
+
+        max_jump = ship.max_jump()
+
+        for other_world, distance in current_world.neighbour_distances():
+            world_id = other_world.id
+
+            if (visited >> world_id) & 1:
+                continue
+
+            if recent.count(world_id) > 1:
+                continue
+
+            if world_id in avoid_ids:
+                continue
+            if previous_world is not None and previous_world == other_world:
+                continue
+
+            if other_world.zone == "R":
+                continue
+
+            if other_world.size is None:
+                continue
+
+            for allegiance in ship.banned_allegiances:
+                if other_world.allegiance.startswith(allegiance):
+                    continue
+
+            if distance > max_jump:
+                continue
+
+            route = self.__next_route(other_world, distance)
+
+            if route is not None:
+                yield route
+
+    def step(self, other_world):
+        # This route carried on to other_world whether or not the search would go there, None when the leg can't be made
+        distance = self.world.distance(other_world)
+
+        if distance > self.context.ship.max_jump():
+            return None
+
+        return self.__next_route(other_world, distance)
+
+    def __next_route(self, other_world, distance):
+        leg = self.__leg(other_world, distance)
+
+        if leg is None:
+            return None
+
+        context = self.context
+        total_duration, state, final_capital = leg
+        outcomes = self.__simulate_leg(other_world, distance) if context.dice is not None else None
+        return Route(context, other_world, self, total_duration - context.start_duration, state, final_capital - context.starting_capital, outcomes)
+
+    def __leg(self, other_world, distance, log=None):
+        # Narrative is only collected when log is given, the winning route replays its legs to print them
+        context = self.context
+        ship = context.ship
+        data_loader = context.data_loader
+        current_world = self.world
+        # The snapshot is for where the search sets off from, which is only the start of the journey on the first plan
+        starting_world = self.parent is None
+        header = len(log) if log is not None else None
+
+        duration = ship.jumps_required(distance) + 1
+        total_duration = self.total_duration + duration
+        state = self.state.copy()
+        capital = self.__expenses(self.capital(), distance, total_duration, state, log)
+
+        leg_cache = data_loader.leg_cache()
+        passenger_revenue, description = leg_cache.passengers(current_world, other_world, ship, starting_world)
+
+        if passenger_revenue > 0: 
+            if log is not None:
+                log.append(LogLine("{}, capital {:,.2f}->{:,.2f}", description, capital, passenger_revenue + capital))
+            capital += passenger_revenue 
+
+        if log is None:
+            starting_capital = capital
+            final_capital = leg_cache.final_capital(current_world, other_world, data_loader.trade_goods(), ship, capital, starting_world)
+        else:
+            starting_capital, final_capital, deals = current_world.best_trades(other_world, data_loader.trade_goods(), ship, capital, starting_world)
+            log += deals
+
+        if final_capital is None:
+            return None
+
+        if ship.contract:
+            cut, description = ship.contract.profit_cut(state, other_world, starting_capital, final_capital)
+
+            if cut is not None:
+                if log is not None:
+                    log.append(description)
+                final_capital -= cut
+        elif log is not None:
+            log.append(LogLine("No Maint or mortgage as we go from {}->{}", self.total_duration, total_duration))
+
+        if final_capital < 0:
+            return None
+
+        if log is not None:
+            new_net_worth = final_capital
+
+            if ship.contract:
+                new_net_worth -= ship.contract.current_cut(state)
+
+            log.insert(header, LogLine(bcolors.BOLD + "{} -> {}" + bcolors.ENDC + " ({} hexes, {} weeks) {} net worth {:,.2f} -> {:,.2f}", current_world.name, other_world.name, distance, duration, other_world.sector_hex, self.net_worth(), new_net_worth))
+
+        # Unchanged contract state is shared with the parent rather than kept as another copy
+        if state == self.state:
+            state = self.state
+
+        return total_duration, state, final_capital
+
+    def __expenses(self, capital, distance, total_duration, state, log=None):
+        # Fuel, then maintenance, life support, income and mortgage when the leg runs into a new month
+        ship = self.context.ship
+        data_loader = self.context.data_loader
+        cost = ship.fuel_cost(distance)
+        if log is not None:
+            log.append(LogLine("Buy unrefined fuel for {}, capital {:,.2f}->{:,.2f}", cost, capital, capital - cost))
+        capital -= cost
+
+        if math.floor(self.total_duration / 4) < math.floor(total_duration / 4):
+            if log is not None:
+                log.append(LogLine("Ship Maintenance paid of {:,.2f}, capital: {:,.2f}->{:,.2f}", ship.monthly_maint, capital, capital - ship.monthly_maint))
+            capital -= ship.monthly_maint
+
+            life_support = ship.monthly_life_support(data_loader)
+            if log is not None:
+                log.append(LogLine("Ship Life Support paid of {:,.2f}, capital: {:,.2f}->{:,.2f}", life_support, capital, capital - life_support))
+            capital -= life_support
+
+            if ship.contract:
+                income = ship.contract.monthly_income()
+
+                if income > 0:
+                    if log is not None:
+                        log.append(LogLine("Monthly Income of {:,.2f}, capital: {:,.2f}->{:,.2f}", income, capital, capital + income))
+                    capital += income
+
+                mortgage_payment = ship.contract.mortgage_payment(state)
+                if mortgage_payment > 0:
+                    if log is not None:
+                        log.append(LogLine("Mortgage paid of {:,.2f}, capital: {:,.2f}->{:,.2f}", mortgage_payment, capital, capital - mortgage_payment))
+                    capital -= mortgage_payment
+
+        return capital
+
+    def __simulate_leg(self, other_world, distance):
+        # The leg for every simulated roll of the dice, only passengers, trades and the contract's cut differ between them
+        context = self.context
+        ship = context.ship
+        current_world = self.world
+        starting_world = self.parent is None
+        rng = context.dice.rng(current_world, other_world, self.total_duration)
+
+        total_duration = self.total_duration + ship.jumps_required(distance) + 1
+        state = self.outcome_state.copy()
+        capital = self.__expenses(self.outcomes.copy(), distance, total_duration, state)
+        capital += current_world.sample_passengers(other_world, ship, starting_world, rng, len(capital))
+
+        final_capital = current_world.sample_trades(other_world, ship, capital, starting_world, rng)
+
+        if ship.contract:
+            final_capital -= ship.contract.profit_cuts(state, other_world, capital, final_capital)
+
+        return final_capital, state
+
+    def projected_duration(self):
+        destination = self.context.complete_condition.destination
+
+        if self.complete or not destination:
+            return self.route_duration
+        
+        remaining_distance = self.world.distance(destination)
+        remaining_duration = self.context.ship.expected_duration(remaining_distance)
+        return self.route_duration + remaining_duration
+
+    def crow_flies(self):
+        destination = self.context.complete_condition.destination
+
+        if self.complete or not destination:
+            return self.route_duration
+
+        return self.context.start.distance(destination)
+    
+    def capital(self):
+        return self.context.starting_capital + self.profit
+
+    def net_worth(self):
+        net_worth = self.capital()
+
+        if self.context.ship.contract:
+            net_worth -= self.context.ship.contract.current_cut(self.state)
+
+        return net_worth
+
+    def real_profit(self):
+        return self.net_worth() - self.context.starting_net_worth
+    
+    def profit_per_week(self):
+        return self.real_profit() / self.route_duration
+
+    def outcome_profits(self):
+        # Real profit for each simulated roll of the dice
+        net_worth = self.outcomes
+
+        if self.context.ship.contract:
+            net_worth = net_worth - self.context.ship.contract.current_cut(self.outcome_state)
+
+        return net_worth - self.context.starting_net_worth
+
+    def ranking_profit(self):
+        # The profit routes are ranked by, the risk adjusted profit when the dice are simulated
+        if self.outcomes is None:
+            return self.real_profit()
+
+        return self.context.dice.risk_adjusted(self.outcome_profits())
+
+    def score(self):
+        # What the priority of a completed route ranks by, larger is better
+        return self.ranking_profit() / self.route_duration / self.route_duration
+
+    def __priority(self):
+        # Smaller sorts first, profit per week normalised by projected duration
+        if self.route_duration == 0:
+            return (0.0, 0)
+
+        projected_duration = self.projected_duration()
+        return (-self.ranking_profit() / self.route_duration / projected_duration, projected_duration)
+
+    def __lt__(self, other):
+        if other is None:
+            return True
+
+        return self.priority < other.priority
+
+    
+    def __eq__(self, other):
+        return False
+
+class Frontier:
+    def __init__(self) -> None:
+        self.__heap = []
+        self.__counter = 0
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def push(self, route):
+        # The counter breaks ties so routes themselves are never compared
+        heapq.heappush(self.__heap, (route.priority, self.__counter, route))
+        self.__counter += 1
+
+    def pop(self):
+        return heapq.heappop(self.__heap)[2]
+
+    def peek(self, count):
+        return [entry[2] for entry in heapq.nsmallest(count, self.__heap)]
+
+    def __iter__(self):
+        return (entry[2] for entry in self.__heap)
+
+    def close(self):
+        pass
+
+class BeamFrontier:
+    # A Frontier that keeps at most width routes for each number of legs (by "depth") or week (by "week") routes have reached.
+    # A route that doesn't fit pushes out the worst route kept for it, or is dropped if it is the worst. Dropped routes might
+    # have led to the best route, so they are counted in the stats along with the largest of their bounds
+    def __init__(self, width, by, stats) -> None:
+        if by not in ("depth", "week"):
+            raise Exception(f"Beam width can be per depth or week, not {by}")
+
+        self.__width = width
+        self.__by = by
+        self.__stats = stats
+        self.__heap = []
+        self.__counter = 0
+        # Worst route first for each depth or week, negated priorities and counters make heapq a max heap
+        self.__buckets = dict()
+        self.__bucket_entries = 0
+        # Counter to depth or week of every route on the frontier, entries of other routes in the heaps are stale
+        self.__live = dict()
+        self.__sizes = dict()
+
+    def __len__(self):
+        return len(self.__live)
+
+    def __bucket(self, route):
+        return route.depth if self.__by == "depth" else route.total_duration
+
+    def __worst(self, bucket):
+        entries = self.__buckets[bucket]
+
+        while entries:
+            counter = -entries[0][1]
+
+            if counter in self.__live and not entries[0][2].dominated:
+                return entries[0]
+
+            heapq.heappop(entries)
+            self.__bucket_entries -= 1
+
+            # Routes pruned by dominance give up their place in the beam
+            if self.__live.pop(counter, None) is not None:
+                self.__sizes[bucket] -= 1
+
+        return None
+
+    def __drop(self, route):
+        self.__stats.beam_dropped += 1
+
+        if route.bound is not None and (self.__stats.beam_dropped_bound is None or route.bound > self.__stats.beam_dropped_bound):
+            self.__stats.beam_dropped_bound = route.bound
+
+    def push(self, route):
+        bucket = self.__bucket(route)
+        negated = tuple(-value for value in route.priority)
+
+        if self.__sizes.get(bucket, 0) >= self.__width:
+            worst = self.__worst(bucket)
+
+            # Dominated routes cleared out by __worst may have made room
+            if worst is not None and self.__sizes[bucket] >= self.__width:
+                if negated <= worst[0]:
+                    self.__drop(route)
+                    return
+
+                heapq.heappop(self.__buckets[bucket])
+                self.__bucket_entries -= 1
+                del self.__live[-worst[1]]
+                self.__sizes[bucket] -= 1
+                worst[2].dominated = True
+                self.__drop(worst[2])
+
+        heapq.heappush(self.__heap, (route.priority, self.__counter, route))
+        heapq.heappush(self.__buckets.setdefault(bucket, []), (negated, -self.__counter, route))
+        self.__bucket_entries += 1
+        self.__live[self.__counter] = bucket
+        self.__sizes[bucket] = self.__sizes.get(bucket, 0) + 1
+        self.__counter += 1
+
+        if len(self.__heap) + self.__bucket_entries > 4 * len(self.__live) + 64:
+            self.__compact()
+
+    def __compact(self):
+        # Routes pushed out or expanded leave stale entries behind, which are cleared once they outnumber the live ones
+        self.__heap = [entry for entry in self.__heap if entry[1] in self.__live]
+        heapq.heapify(self.__heap)
+        self.__buckets = dict()
+
+        for priority, counter, route in self.__heap:
+            self.__buckets.setdefault(self.__live[counter], []).append((tuple(-value for value in priority), -counter, route))
+
+        for entries in self.__buckets.values():
+            heapq.heapify(entries)
+
+        self.__bucket_entries = len(self.__heap)
+
+    def pop(self):
+        while True:
+            _, counter, route = heapq.heappop(self.__heap)
+            bucket = self.__live.pop(counter, None)
+
+            if bucket is not None:
+                self.__sizes[bucket] -= 1
+                return route
+
+    def peek(self, count):
+        return [entry[2] for entry in heapq.nsmallest(count, self.__heap)]
+
+    def __iter__(self):
+        return (entry[2] for entry in self.__heap if entry[1] in self.__live)
+
+    def close(self):
+        pass
+
+class SpillFrontier:
+    # A Frontier that keeps at most max_routes routes in memory. Past that the worse half is pickled to a temporary file in
+    # directory as a run sorted by priority and read back a chunk at a time when the search gets to it, the chunks read back
+    # count towards max_routes and once there are more than FAN_IN runs the smaller half are merged into one. The context and
+    # worlds are written by reference, as are parents, which have all been expanded and are kept in memory while routes on
+    # disk refer to them
+    CHUNK = 256
+    FAN_IN = 16
+
+    def __init__(self, context, max_routes, directory, dominance, stats) -> None:
+        self.__context = context
+        self.__max_routes = max(max_routes, 2)
+        # Small enough for a chunk of every run to fit in half of max_routes
+        self.__chunk = max(min(self.CHUNK, self.__max_routes // (2 * (self.FAN_IN + 1))), 1)
+        self.__directory = directory
+        self.__dominance = dominance
+        self.__stats = stats
+        self.__heap = []
+        self.__counter = 0
+        # Parents by id with how many routes on disk refer to them
+        self.__parents = dict()
+        self.__writing = set()
+        # Each run is [file, offsets of its chunks, next chunk, buffered entries, entries left], heads holds the first entry of each run
+        self.__runs = []
+        self.__heads = []
+        self.__on_disk = 0
+        self.__buffered = 0
+
+    def __len__(self):
+        return len(self.__heap) + self.__on_disk
+
+    def __persistent_id(self, obj):
+        kind = type(obj)
+
+        if kind is World:
+            return ("world", obj.id)
+
+        if kind is Route and id(obj) not in self.__writing:
+            parent = self.__parents.get(id(obj))
+
+            if parent is None:
+                parent = self.__parents[id(obj)] = [obj, 0]
+
+            parent[1] += 1
+            return ("route", id(obj))
+
+        if obj is self.__context:
+            return ("context",)
+
+        return None
+
+    def __persistent_load(self, pid, release):
+        if pid[0] == "context":
+            return self.__context
+
+        if pid[0] == "world":
+            return self.__context.data_loader.world(pid[1])
+
+        parent = self.__parents[pid[1]]
+
+        # A route read back off disk holds on to its parent itself
+        if release:
+            parent[1] -= 1
+
+            if parent[1] == 0:
+                del self.__parents[pid[1]]
+
+        return parent[0]
+
+    def push(self, route):
+        heapq.heappush(self.__heap, (route.priority, self.__counter, route))
+        self.__counter += 1
+
+        if len(self.__heap) > self.__limit():
+            self.__spill()
+
+    def __limit(self):
+        return max(self.__max_routes - self.__buffered, 2)
+
+    def __spill(self):
+        entries = sorted(self.__heap)
+        keep = self.__limit() // 2
+        # A sorted list is already a heap
+        self.__heap = entries[:keep]
+        self.__stats.spilled += self.__write(entries[keep:])
+
+        if len(self.__runs) > self.FAN_IN:
+            self.__merge()
+
+    def __merge(self):
+        # The smaller half of the runs are read back in order and written out again as one
+        runs = sorted(self.__runs, key=lambda run: run[4])[:len(self.__runs) // 2 + 1]
+        merging = {id(run) for run in runs}
+        self.__heads = [head for head in self.__heads if id(head[2]) not in merging]
+        heapq.heapify(self.__heads)
+        heads = [(run[3][-1][0], run[3][-1][1], run) for run in runs]
+        heapq.heapify(heads)
+        self.__write(self.__checked(self.__pop_run(heads)) for _ in range(sum(run[4] for run in runs)))
+
+    def __write(self, entries):
+        # Pickles entries sorted by priority to a new run a chunk at a time, leaving out dominated routes, and returns how many were written
+        run = [tempfile.TemporaryFile(dir=self.__directory), [], 0, [], 0]
+        chunk = []
+
+        for entry in entries:
+            if not entry[2].dominated:
+                chunk.append(entry)
+
+                if len(chunk) == self.__chunk:
+                    self.__dump(run, chunk)
+                    chunk = []
+
+        if chunk:
+            self.__dump(run, chunk)
+
+        if run[4] == 0:
+            run[0].close()
+            return 0
+
+        self.__runs.append(run)
+        self.__on_disk += run[4]
+        self.__advance(run, self.__heads)
+        return run[4]
+
+    def __dump(self, run, chunk):
+        file = run[0]
+        run[1].append(file.tell())
+        run[4] += len(chunk)
+        self.__writing = {id(entry[2]) for entry in chunk}
+        pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = self.__persistent_id
+        pickler.dump(chunk)
+        self.__writing = set()
+
+    def __read(self, run, chunk, release=True):
+        file = run[0]
+        file.seek(run[1][chunk])
+        unpickler = pickle.Unpickler(file)
+        unpickler.persistent_load = lambda pid: self.__persistent_load(pid, release)
+        return unpickler.load()
+
+    def __advance(self, run, heads):
+        # Puts the next entry of a run on a heads heap, loading its next chunk when the buffer is empty
+        if not run[3]:
+            if run[2] == len(run[1]):
+                run[0].close()
+                self.__runs = [other for other in self.__runs if other is not run]
+                return
+
+            run[3] = self.__read(run, run[2])
+            run[3].reverse()
+            run[2] += 1
+            self.__buffered += len(run[3])
+
+        priority, counter, _ = run[3][-1]
+        heapq.heappush(heads, (priority, counter, run))
+
+    def __pop_run(self, heads):
+        run = heapq.heappop(heads)[2]
+        entry = run[3].pop()
+        run[4] -= 1
+        self.__buffered -= 1
+        self.__on_disk -= 1
+        self.__advance(run, heads)
+        return entry
+
+    def __checked(self, entry):
+        # A route read back is a new object, so a route that dominated it since it was written can't have marked it
+        route = entry[2]
+        route.dominated = self.__dominance is not None and self.__dominance.dominated(route)
+        return entry
+
+    def pop(self):
+        if self.__heads and (not self.__heap or self.__heads[0][:2] < self.__heap[0][:2]):
+            return self.__checked(self.__pop_run(self.__heads))[2]
+
+        return heapq.heappop(self.__heap)[2]
+
+    def peek(self, count):
+        # Only the routes in memory, which are the best unless the search has gone past most of them
+        return [entry[2] for entry in heapq.nsmallest(count, self.__heap)]
+
+    def __iter__(self):
+        for entry in self.__heap:
+            yield entry[2]
+
+        # Chunks still on disk are read without letting go of parents, as their routes stay there
+        for run in list(self.__runs):
+            for entry in run[3]:
+                yield self.__checked(entry)[2]
+
+            for chunk in range(run[2], len(run[1])):
+                for entry in self.__read(run, chunk, False):
+                    yield self.__checked(entry)[2]
+
+    def close(self):
+        for run in self.__runs:
+            run[0].close()
+
+        self.__runs = []
+        self.__heads = []
+        self.__parents = dict()
+
+# Set in the parent before the pool forks so workers read the warmed loader and ship without them being pickled
+_parallel_data_loader = None
+_parallel_ship = None
+
+def _evaluate_legs(task):
+    origin, starting_world, destinations = task
+    world = _parallel_data_loader.load_world_data(origin)
+    neighbours = {other_world.sector_hex: other_world for other_world in world.neighbours}
+    trade_goods = _parallel_data_loader.trade_goods()
+    results = []
+
+    for destination in destinations:
+        other_world = neighbours[destination]
+        passengers = world.passengers(other_world, _parallel_ship, starting_world)
+        candidates = world.trade_candidates(other_world, trade_goods, _parallel_ship, starting_world)
+        results.append((passengers, candidates))
+
+    return results
+
+class ParallelLegEvaluator:
+    # Fans leg evaluation for a batch of frontier routes out to worker processes and stores the results in the leg cache,
+    # the search itself stays serial so it picks the same route as a single process run
+    def __init__(self, data_loader, ship, workers, batch_size) -> None:
+        global _parallel_data_loader, _parallel_ship
+        _parallel_data_loader = data_loader
+        _parallel_ship = ship
+        self.__data_loader = data_loader
+        self.__ship = ship
+        self.__batch_size = batch_size
+        self.__pool = multiprocessing.get_context("fork").Pool(workers)
+
+    def close(self):
+        self.__pool.close()
+        self.__pool.join()
+
+    def __pending_legs(self, route):
+        leg_cache = self.__data_loader.leg_cache()
+        world = route.world
+        starting_world = route.parent is None
+        max_jump = self.__ship.max_jump()
+
+        return [
+            other_world for other_world, distance in world.neighbour_distances()
+            if distance <= max_jump and other_world.zone != "R" and other_world.size is not None
+            and not leg_cache.has(world, other_world, self.__ship, starting_world)
+        ]
+
+    def evaluate(self, route, frontier):
+        if route.complete or not self.__pending_legs(route):
+            return
+
+        tasks = dict()
+
+        for candidate in [route] + frontier.peek(self.__batch_size - 1):
+            key = (candidate.world.id, candidate.parent is None)
+
+            if candidate.complete or candidate.dominated or key in tasks:
+                continue
+
+            pending = self.__pending_legs(candidate)
+
+            if pending:
+                tasks[key] = (candidate.world, pending)
+
+        # Worlds are sent by sector hex as ids are only meaningful to the loader that handed them out
+        work = [(world.sector_hex, starting_world, [other_world.sector_hex for other_world in pending]) for (_, starting_world), (world, pending) in tasks.items()]
+        leg_cache = self.__data_loader.leg_cache()
+
+        for ((_, starting_world), (world, pending)), results in zip(tasks.items(), self.__pool.map(_evaluate_legs, work)):
+            for other_world, (passengers, candidates) in zip(pending, results):
+                leg_cache.store(world, other_world, self.__ship, starting_world, passengers, candidates)
+
+class DiceSimulator:
+    # Rolls the dice behind passengers, tons on sale and prices for many samples at once instead of assuming averages.
+    # Rolls are seeded by the leg and the week it starts, so every route making the same leg in the same week sees the
+    # same outcomes and differences between routes aren't noise. Routes are ranked by the profit reached in all but
+    # percentile percent of samples
+    def __init__(self, samples=1000, percentile=10, seed=0) -> None:
+        self.samples = samples
+        self.percentile = percentile
+        self.seed = seed
+
+    def rng(self, world, other_world, total_duration):
+        return np.random.default_rng((self.seed, world.id, other_world.id, total_duration))
+
+    def outcomes(self, capital, state):
+        return np.full(self.samples, float(capital)), dict(state)
+
+    def risk_adjusted(self, profits):
+        return float(np.percentile(profits, self.percentile))
+
+    def bands(self, route, percentiles=(5, 25, 50, 75, 95)):
+        return dict(zip(percentiles, np.percentile(route.outcome_profits(), percentiles)))
+
+    def describe(self, route):
+        profits = route.outcome_profits()
+        bands = ", ".join(f"{percentile}% {profit:,.2f}" for percentile, profit in self.bands(route).items())
+        return f"Simulated profit over {len(profits):,} samples: mean {profits.mean():,.2f}, percentiles {bands}, chance of a loss {(profits < 0).mean():.1%}"
+
+class SearchOptions:
+    # patience is how many completed routes in a row may fail to beat the best before giving up, None searches until the bound proves the best route.
+    # dice is a DiceSimulator to rank routes by simulated rolls rather than average ones.
+    # trace samples frontier sizes and times the leg cache, leg evaluation and world loading calls, trace_file appends the stats of each
+    # search to a JSON lines file and profile_dir saves a cProfile of each phase of each search there.
+    # beam_width keeps only that many routes per depth or week (beam_by) on the frontier, spill_routes keeps that many in
+    # memory and writes the rest to temporary files in spill_dir.
+    # time_budget (seconds) and node_budget (routes expanded) stop the search early with the best route so far, on_improvement
+    # is called with each better route as it is found
+    def __init__(self, dominance_pruning=False, workers=1, parallel_batch=32, branch_and_bound=False, patience=10, dice=None, trace=False, trace_file=None, profile_dir=None, beam_width=None, beam_by="depth", spill_routes=None, spill_dir=None, time_budget=None, node_budget=None, on_improvement=None) -> None:
+        self.dominance_pruning = dominance_pruning
+        self.workers = workers
+        self.parallel_batch = parallel_batch
+        self.branch_and_bound = branch_and_bound
+        self.patience = patience
+        self.dice = dice
+        self.trace = trace or trace_file is not None
+        self.trace_file = trace_file
+        self.profile_dir = profile_dir
+        self.beam_width = beam_width
+        self.beam_by = beam_by
+        self.spill_routes = spill_routes
+        self.spill_dir = spill_dir
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.on_improvement = on_improvement
+
+_search_ids = itertools.count(1)
+
+class SearchStats:
+    FRONTIER_SAMPLES = 1000
+
+    def __init__(self) -> None:
+        self.search_id = f"{os.getpid()}-{next(_search_ids)}"
+        self.expanded = 0
+        self.completed = 0
+        self.pruned = 0
+        self.bounded = 0
+        self.best_score = None
+        self.upper_bound = None
+        # Routes a beam pushed off the frontier and the largest of their bounds, and routes written to disk
+        self.beam_dropped = 0
+        self.beam_dropped_bound = None
+        self.spilled = 0
+        # The budget that ran out if the search was stopped by one
+        self.stopped = None
+        self.elapsed = 0.0
+        self.phases = dict()
+        self.max_frontier = 0
+        # (routes expanded, frontier size) every frontier_interval expansions, and [calls, seconds] for each timed call, when tracing
+        self.frontier_sizes = []
+        self.frontier_interval = 1
+        self.timings = dict()
+        self.caches = dict()
+
+    def sample_frontier(self, size):
+        # Once the series is full every other sample is dropped and the interval doubles, so long searches keep a fixed number
+        if self.expanded % self.frontier_interval:
+            return
+
+        if len(self.frontier_sizes) >= self.FRONTIER_SAMPLES:
+            self.frontier_interval *= 2
+            self.frontier_sizes = [sample for sample in self.frontier_sizes if sample[0] % self.frontier_interval == 0]
+
+            if self.expanded % self.frontier_interval:
+                return
+
+        self.frontier_sizes.append((self.expanded, size))
+
+    def optimality_gap(self):
+        # How far the best route could be from the best route in the search space, 0 when it is proven best
+        if self.best_score is None or self.upper_bound is None or self.upper_bound <= self.best_score:
+            return 0.0
+
+        return (self.upper_bound - self.best_score) / abs(self.upper_bound)
+
+    def __str__(self) -> str:
+        text = f"Expanded {self.expanded:,} routes, completed {self.completed:,}, pruned {self.pruned:,}"
+
+        if self.upper_bound is not None:
+            gap = self.optimality_gap()
+            text += f", bounded {self.bounded:,}, " + ("proven best" if gap == 0 else f"optimality gap {gap:.1%}")
+
+        if self.beam_dropped:
+            text += f", beam dropped {self.beam_dropped:,}"
+
+            if self.upper_bound is None:
+                text += " so a better route may have been missed"
+
+        if self.spilled:
+            text += f", spilled {self.spilled:,} to disk"
+
+        if self.stopped is not None:
+            text += f", stopped by the {self.stopped}"
+
+        return text
+
+    def as_dict(self):
+        data = dict(vars(self))
+        data["optimality_gap"] = self.optimality_gap() if self.upper_bound is not None else None
+        return data
+
+    def report(self):
+        # Everything collected about the search for printing
+        lines = [str(self), f"Took {self.elapsed:.3f}s ({', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in self.phases.items())}), largest frontier {self.max_frontier:,} routes"]
+
+        for name, (calls, seconds) in sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True):
+            if calls:
+                lines.append(f"{name}: {calls:,} calls, {seconds:.3f}s")
+
+        for name, (hits, misses) in self.caches.items():
+            total = hits + misses
+            lines.append(f"{name} cache: {hits:,} hits, {misses:,} misses" + (f", {hits / total:.1%} hit rate" if total else ""))
+
+        return "\n".join(lines)
+
+class CallTimer:
+    # Counts and times calls the search's hot paths make through it, they only do so while a traced search has it on its
+    # context and leg cache. Times include any timed calls made inside, a call made inside one of the same name is only timed once
+    def __init__(self) -> None:
+        self.timings = dict()
+        self.__running = set()
+
+    def call(self, name, function, *args):
+        if name in self.__running:
+            return function(*args)
+
+        self.__running.add(name)
+        started = time.perf_counter()
+
+        try:
+            return function(*args)
+        finally:
+            timing = self.timings.setdefault(name, [0, 0.0])
+            timing[0] += 1
+            timing[1] += time.perf_counter() - started
+            self.__running.discard(name)
+
+class SearchPhases:
+    # Times the phases of a search into its stats and, given a directory, saves a cProfile of each phase there
+    def __init__(self, stats, profile_dir=None) -> None:
+        self.__stats = stats
+        self.__profile_dir = profile_dir
+        self.__phase = None
+        self.__started = None
+        self.__profiler = None
+
+    def start(self, phase):
+        self.stop()
+        self.__phase = phase
+        self.__started = time.perf_counter()
+
+        if self.__profile_dir is not None:
+            self.__profiler = cProfile.Profile()
+            self.__profiler.enable()
+
+    def stop(self):
+        if self.__phase is None:
+            return
+
+        if self.__profiler is not None:
+            self.__profiler.disable()
+            Path(self.__profile_dir).mkdir(parents=True, exist_ok=True)
+            self.__profiler.dump_stats(os.path.join(self.__profile_dir, f"{self.__stats.search_id}-{self.__phase}.prof"))
+            self.__profiler = None
+
+        phases = self.__stats.phases
+        phases[self.__phase] = phases.get(self.__phase, 0.0) + time.perf_counter() - self.__started
+        self.__phase = None
+
+class ProfitBound:
+    # Upper bound on the score any completion of a route can reach. Costs are ignored, every berth is filled and cargo earns
+    # the best margins on offer from any world the route could still set off from, limited by the hold, the tons on sale and
+    # the capital available to buy with. Capital is assumed to grow by the whole of every leg's takings, net worth only by
+    # what the contract lets the ship keep
+    CAPITAL_STEP = 1.005
+    EXACT_WEEKS = 8
+    WEEKS_STEP = 1.1
+
+    def __init__(self, context) -> None:
+        self.__context = context
+        ship = context.ship
+        data_loader = context.data_loader
+        table = data_loader.price_table()
+        condition = context.complete_condition
+        self.__max_jump = ship.max_jump()
+        income = max(ship.contract.monthly_income(), 0) if ship.contract else 0
+        self.__kept_share = ship.contract.kept_profit_share() if ship.contract else 1
+
+        legs = dict()
+
+        for distance in range(1, self.__max_jump + 1):
+            cargo = ship.cargo_capacity(distance)
+
+            if cargo is not None:
+                legs[distance] = (ship.jumps_required(distance) + 1, self.__passenger_ceiling(distance) + income, cargo, data_loader.passage("freight", distance))
+
+        # (distance, margin, purchase price, tons) for every kind of leg the rest of a route could take
+        if condition.max_duration is not None:
+            # Every leg takes at least two weeks so a route can only set off from so many jumps away
+            hops = max(math.ceil(condition.max_duration / 2) - 1, 0)
+            trades = self.__region_trades(table, self.__region(hops), ship.max_broker)
+        else:
+            trades = [(distance,) + table.global_margins(ship.max_broker) for distance in legs]
+
+        trades = [trade for trade in trades if trade[0] in legs]
+        top = max((((margin - legs[distance][3]) / purchase_price).max(initial=0) for distance, margin, purchase_price, _ in trades), default=0.0)
+        self.__prices = np.array([0.0] + [top * 0.8 ** i for i in range(40)])
+
+        # Lagrangian relaxation of the capital limit: for any price mu on capital a leg takes at most
+        # passengers + freight + best fill of the hold at (margin - freight - mu * purchase price) + mu * capital
+        takings = []
+        durations = []
+
+        for distance, margin, purchase_price, tons in trades:
+            duration, passengers, cargo, freight = legs[distance]
+            values = np.maximum(margin - freight - np.outer(self.__prices, purchase_price), 0)
+            order = np.argsort(-values, axis=1)
+            values = np.take_along_axis(values, order, axis=1)
+            ordered_tons = tons[order]
+            before = np.cumsum(ordered_tons, axis=1) - ordered_tons
+            fill = np.clip(cargo - before, 0, ordered_tons)
+            takings.append(passengers + cargo * freight + (fill * values).sum(axis=1))
+            durations.append(duration)
+
+        self.__min_leg = min((duration for duration, _, _, _ in legs.values()), default=2)
+        self.__max_leg = max((duration for duration, _, _, _ in legs.values()), default=2)
+        self.__passenger_rate = max((passengers / duration for duration, passengers, _, _ in legs.values()), default=0.0)
+        takings, durations = self.__undominated(takings, durations)
+        self.__takings = np.array(takings).reshape(len(takings), len(self.__prices))
+        self.__durations = np.array(durations, dtype=float).reshape(len(durations), 1)
+        self.__weekly = dict()
+        self.__trajectories = dict()
+
+        # Most net worth a week can add whatever the capital
+        rate = float((self.__takings[:, 0:1] / self.__durations).max(initial=0))
+        self.rate = self.__kept_share * rate + (1 - self.__kept_share) * self.__passenger_rate
+
+    def __passenger_ceiling(self, distance):
+        data_loader = self.__context.data_loader
+        revenue = 0
+
+        for passage in self.__context.ship.passage:
+            fare = data_loader.passage(passage.type, distance) - data_loader.life_support(passage.type) * distance / 4
+
+            # Empty middle berths are taken by two basic passengers
+            if passage.type == "middle":
+                fare = max(fare, 2 * data_loader.passage("basic", distance))
+
+            revenue += passage.number * max(fare, 0)
+
+        return revenue
+
+    def __destinations(self, world):
+        # Neighbours generate_next_steps could take a leg to, ignoring the rules that depend on the route so far
+        avoid_ids = self.__context.avoid_ids
+        return [
+            (other_world, distance) for other_world, distance in world.neighbour_distances()
+            if distance <= self.__max_jump and other_world.zone != "R" and other_world.size is not None and other_world.id not in avoid_ids
+        ]
+
+    def __region(self, hops):
+        start = self.__context.start
+        region = {start}
+        edge = [start]
+
+        for _ in range(hops):
+            next_edge = []
+
+            for world in edge:
+                for other_world, _ in self.__destinations(world):
+                    if other_world not in region:
+                        region.add(other_world)
+                        next_edge.append(other_world)
+
+            edge = next_edge
+
+        return region
+
+    def __region_trades(self, table, region, skill):
+        trades = []
+
+        for world in region:
+            by_distance = dict()
+
+            for other_world, distance in self.__destinations(world):
+                by_distance.setdefault(distance, []).append(other_world)
+
+            for distance, neighbours in by_distance.items():
+                trades.append((distance,) + table.leg_margins(world, neighbours, skill))
+
+        return trades
+
+    @staticmethod
+    def __undominated(takings, durations):
+        # A leg that takes no more than another of the same length at every price on capital never sets the bound
+        kept = []
+
+        for i in sorted(range(len(takings)), key=lambda i: -takings[i][0]):
+            if not any(durations[j] == durations[i] and (takings[j] >= takings[i]).all() for j in kept):
+                kept.append(i)
+
+        return [takings[i] for i in kept], [durations[i] for i in kept]
+
+    def __weekly_takings(self, step):
+        # Most capital a week of travel can add when setting off with CAPITAL_STEP ** step
+        takings = self.__weekly.get(step)
+
+        if takings is None:
+            capital = self.CAPITAL_STEP ** step
+            takings = self.__weekly[step] = float(((self.__takings + self.__prices * capital) / self.__durations).min(axis=1).max(initial=0))
+
+        return takings
+
+    def __trajectory(self, capital, weeks):
+        # Most capital can reach after each of the given weeks, from the grid step at or above capital. A leg's takings only
+        # depend on the capital it sets off with, which is never more than this trajectory, and weekly takings only rise with
+        # capital. Trajectories are kept per grid step so each is worked out once per bound
+        step = math.ceil(math.log(max(capital, 1), self.CAPITAL_STEP))
+        trajectory = self.__trajectories.get(step)
+
+        if trajectory is None:
+            trajectory = self.__trajectories[step] = [self.CAPITAL_STEP ** step]
+
+        while len(trajectory) <= weeks:
+            current = trajectory[-1]
+            trajectory.append(current + self.__weekly_takings(math.ceil(math.log(current, self.CAPITAL_STEP))))
+
+        return trajectory
+
+    def __gain(self, takings, weeks):
+        # Most net worth can grow in the given weeks with the given takings
+        passengers = self.__passenger_rate * weeks
+        return min(self.__kept_share * takings + (1 - self.__kept_share) * min(passengers, takings), self.rate * weeks)
+
+    @staticmethod
+    def __peak(offset, rate, first, last):
+        # Largest (offset + rate * weeks) / weeks ** 2 for weeks from first to last, which rises until -2 * offset / rate and falls after
+        if offset >= 0:
+            weeks = first
+        elif rate > 0:
+            weeks = min(max(-2 * offset / rate, first), last)
+        else:
+            return offset / last ** 2
+
+        return (offset + rate * weeks) / weeks ** 2
+
+    def route_bound(self, route):
+        condition = self.__context.complete_condition
+        duration = route.route_duration
+        earliest = math.inf
+        latest = math.inf
+
+        if condition.destination:
+            # A leg's rounded distance is at most max_jump so it covers less than max_jump + 0.5 of the straight line
+            remaining = math.hypot(route.world.x - condition.destination.x, route.world.y - condition.destination.y)
+            earliest = min(earliest, duration + self.__min_leg * max(math.ceil(remaining / (self.__max_jump + 0.5)), 1))
+
+        if condition.max_profit is not None:
+            earliest = min(earliest, duration + self.__min_leg)
+
+        if condition.max_duration is not None:
+            earliest = min(earliest, max(condition.max_duration, duration + self.__min_leg))
+            latest = condition.max_duration - 1 + self.__max_leg
 
-        x1 = self.hex_x
-        y1 = self.hex_y
-        x2 = other.hex_x
-        y2 = other.hex_y
-        return round((((x1 - x2) ** 2) + ((y1-y2) ** 2)) ** (1/2))
+        earliest = max(earliest, duration + self.__min_leg)
+        profit = route.real_profit()
+        capital = route.capital()
 
-NEU_BAYERN = [SectorHex("Reft", "1822"), SectorHex("Reft", "1923")]
-AMONDIAGE = [SectorHex("Reft", "2325"), SectorHex("Reft", "2225")]
+        # With linear growth the score (profit / weeks squared) peaks at linear_peak weeks and falls after it
+        offset = profit - self.rate * duration
+        linear_peak = -2 * offset / self.rate if offset < 0 and self.rate > 0 else earliest
+        last = min(latest, max(earliest, math.ceil(linear_peak)), earliest + 520)
+        trajectory = self.__trajectory(capital, last - duration)
+        exact = min(last, earliest + self.EXACT_WEEKS - 1)
+        best = max((profit + self.__gain(trajectory[weeks - duration] - capital, weeks - duration)) / weeks ** 2 for weeks in range(earliest, exact + 1))
+        first = exact + 1
 
-class DataLoader:
-    def __init__(self, max_jump) -> None:
-        self.__world_cache = dict()
-        self.__max_jump = max_jump
+        # Past the first few weeks the gain never falls with more weeks, so each stretch of weeks is bounded by the gain at
+        # its end over its first week
+        while first <= last:
+            end = min(max(first, int(first * self.WEEKS_STEP)), last)
+            best = max(best, (profit + self.__gain(trajectory[end - duration] - capital, end - duration)) / first ** 2)
+            first = end + 1
 
-        self.__trade_goods = None
-        self.__passage_freight = None
-        self.__passenger_count = None
-        self.__modified_price = None
-        self.__life_support = None
+        if last < latest:
+            best = max(best, self.__peak(offset, self.rate, last + 1, latest))
 
-    @staticmethod
-    def __jump_worlds(sector, hex, max_jump):
-        file_name = f"cache/{sector}-{hex}-{max_jump}.json"
+        return best
 
-        if os.path.isfile(file_name):
-            with open(file_name, 'r') as file:
-                return json.load(file)
-        
-        # Make sure cache dir exists
-        Path("cache").mkdir(parents=True, exist_ok=True)
+    @staticmethod
+    def prunes(route, best_route):
+        # Equal scores are kept as the shorter of two equal routes wins
+        if best_route is None:
+            return False
 
-        r = requests.get(f'https://travellermap.com/api/jumpworlds?sector={sector}&hex={hex}&jump={max_jump}')
-        jump_data = r.json()
+        best_score = best_route.score()
+        return route.bound < best_score - abs(best_score) * 1e-9
 
-        with open(file_name, 'w') as f:
-            json.dump(jump_data, f)
+class DominanceTable:
+    def __init__(self, stats) -> None:
+        self.__frontiers = dict()
+        self.__stats = stats
 
-        return jump_data
+    @staticmethod
+    def key(route):
+        # The contract state keys tell us which obligations (uncut profits, mortgage) are outstanding
+        return (route.world.id, route.total_duration, tuple(sorted(route.state)))
+
+    def add(self, route):
+        # With simulated dice a route also has to be at least as good on the risk adjusted profit
+        key = self.key(route)
+        capital = route.capital()
+        net_worth = route.net_worth()
+        ranking = route.ranking_profit()
+        frontier = self.__frontiers.get(key, [])
+
+        for other_capital, other_net_worth, other_ranking, _ in frontier:
+            if other_capital >= capital and other_net_worth >= net_worth and other_ranking >= ranking:
+                self.__stats.pruned += 1
+                return False
+
+        survivors = []
+
+        for entry in frontier:
+            if capital >= entry[0] and net_worth >= entry[1] and ranking >= entry[2]:
+                # Routes are held weakly so a SpillFrontier can let go of the routes it writes to disk
+                dominated = entry[3]()
+
+                if dominated is not None:
+                    dominated.dominated = True
+
+                self.__stats.pruned += 1
+            else:
+                survivors.append(entry)
 
+        survivors.append((capital, net_worth, ranking, weakref.ref(route)))
+        self.__frontiers[key] = survivors
+        return True
 
-    def load_world_data(self, sector_hex, force=False):
-        if force or sector_hex not in self.__world_cache:
-            jump_data = self.__jump_worlds(sector_hex.sector, sector_hex.hex, self.__max_jump)
-            current_world = self.__world_cache.get(sector_hex)
-            other_worlds = []
+    def dominated(self, route):
+        # Whether a route added earlier has since been dominated. Equal routes are never both added, so anything at least as
+        # good on every count but not equal to the route has dominated it
+        values = (route.capital(), route.net_worth(), route.ranking_profit())
 
-            for raw_world_data in jump_data["Worlds"]:
-                world = World(raw_world_data, self)
+        for entry in self.__frontiers.get(self.key(route), []):
+            if entry[:3] != values and entry[0] >= values[0] and entry[1] >= values[1] and entry[2] >= values[2]:
+                return True
 
-                if world.sector_hex == sector_hex:
-                    if current_world is None:
-                        current_world = world
-                        self.__world_cache[current_world.sector_hex] = current_world
-                elif world.sector_hex in self.__world_cache:
-                    other_worlds.append(self.__world_cache[world.sector_hex])
-                else:
-                    other_worlds.append(world)
-                    self.__world_cache[world.sector_hex] = world
+        return False
 
-            current_world.neighbours = other_worlds
+def _follow(route, worlds):
+    # The route that goes to each of worlds in turn, if it makes every leg and is complete by the end
+    for world in worlds:
+        if route.complete:
+            break
 
-        return self.__world_cache[sector_hex]
-    
-    def trade_goods(self):
-        if self.__trade_goods is None:
-            self.__trade_goods = []
-            with open('tradeGoods.json', 'r') as file:
-                tradeGoodsRaw = json.load(file)
-                for tradeGoodRaw in tradeGoodsRaw:
-                    self.__trade_goods.append(TradeGood(tradeGoodRaw, self))
+        route = route.step(world)
 
-        return self.__trade_goods
-    
-    def life_support(self, level):
-        if self.__life_support is None:
-            with open('lifeSupport.json', 'r') as file:
-                self.__life_support = json.load(file)
+        if route is None:
+            return None
 
-        return self.__life_support[level]
+    return route if route.complete else None
 
-    def passenger_count(self, roll):
-        if roll < 1:
-            roll = 1
-        elif roll > 20:
-            roll = 20
+def find_best_route(capital, net_worth, ship, data_loader, start, destination, start_duration,avoid, state, options=None, stats=None, incumbent=None):
+    # incumbent is a list of worlds to go to from start that the search begins with as the route to beat
+    options = options or SearchOptions()
+    best_route = None
 
-        if self.__passenger_count is None:
-            with open('passengerCount.json', 'r') as file:
-                self.__passenger_count = json.load(file)
+    for best_route in iter_best_routes(capital, net_worth, ship, data_loader, start, destination, start_duration, avoid, state, options, stats, incumbent):
+        if options.on_improvement is not None:
+            options.on_improvement(best_route)
 
-        return self.__passenger_count[str(roll)] * AVERAGE_D6
+    return best_route
 
+def iter_best_routes(capital, net_worth, ship, data_loader, start, destination, start_duration,avoid, state, options=None, stats=None, incumbent=None):
+    # Returns an iterator over each route better than the last as soon as the search finds it, the last one is the best
+    # route found. Options are checked and the time budget starts when this is called, not when the first route is asked for
+    options = options or SearchOptions()
+    stats = stats if stats is not None else SearchStats()
 
-    def modified_price(self, roll, type):
-        if roll < -3:
-            roll = -3
-        elif roll > 25:
-            roll = 25
+    if options.branch_and_bound and options.dice is not None:
+        raise Exception("Branch and bound assumes average rolls and can't be used with simulated dice")
 
-        if self.__modified_price is None:
-            with open('modifiedPrice.json', 'r') as file:
-                self.__modified_price = json.load(file)
+    if options.beam_width is not None and options.spill_routes is not None:
+        raise Exception("A beam keeps the frontier small so there is nothing to spill, use beam_width or spill_routes")
 
-        return self.__modified_price[str(roll)][type]
+    started = time.perf_counter()
+    deadline = started + options.time_budget if options.time_budget is not None else None
+    return _iter_best_routes(capital, net_worth, ship, data_loader, start, destination, start_duration, avoid, state, options, stats, incumbent, started, deadline)
 
-    def passage(self, type, distance):
-        if self.__passage_freight is None:
-            with open('passageFreight.json', 'r') as file:
-                self.__passage_freight = json.load(file)
+def _iter_best_routes(capital, net_worth, ship, data_loader, start, destination, start_duration, avoid, state, options, stats, incumbent, started, deadline):
+    leg_cache = data_loader.leg_cache()
+    cache_counters = leg_cache.counters()
+    phases = SearchPhases(stats, options.profile_dir)
+    timer = CallTimer() if options.trace else None
 
-        return self.__passage_freight[str(distance)][type]
-    
-class CompleteCondition:
-    def __init__(self, destination=None, max_profit=None, max_duration=None) -> None:
-        self.destination= destination
-        self.max_profit = max_profit
-        self.max_duration = max_duration
+    try:
+        phases.start("setup")
+        dominance = DominanceTable(stats) if options.dominance_pruning else None
+        parallel = ParallelLegEvaluator(data_loader, ship, options.workers, options.parallel_batch) if options.workers > 1 else None
+        search = _search(capital, net_worth, ship, data_loader, start, destination, start_duration, avoid, state, stats, dominance, parallel, options, phases, incumbent, deadline)
+
+        # The leg cache only times calls while the search runs, not while the caller has a route
+        try:
+            leg_cache.timer = timer
+
+            for route in search:
+                leg_cache.timer = None
+                yield route
+                leg_cache.timer = timer
+        finally:
+            leg_cache.timer = None
+            search.close()
+
+            if parallel is not None:
+                parallel.close()
+    finally:
+        phases.stop()
+
+        if timer is not None:
+            stats.timings = timer.timings
+
+        # Leg cache counters are totals for the loader's lifetime, a search's share is the difference
+        stats.caches = {name: (hits - cache_counters[name][0], misses - cache_counters[name][1]) for name, (hits, misses) in leg_cache.counters().items()}
+        stats.elapsed = time.perf_counter() - started
+
+        if options.trace_file is not None:
+            with open(options.trace_file, 'a') as file:
+                file.write(json.dumps({"start": str(start.sector_hex), "capital": capital, "start_duration": start_duration, "stats": stats.as_dict()}) + "\n")
+
+def _search(capital, net_worth, ship, data_loader, start, destination, start_duration, avoid, state, stats, dominance, parallel, options, phases, incumbent=None, deadline=None):
+    context = SearchContext(capital, net_worth, start, avoid, destination, ship, data_loader, start_duration, options.dice)
+    bound = ProfitBound(context) if options.branch_and_bound else None
+
+    if options.beam_width is not None:
+        routes = BeamFrontier(options.beam_width, options.beam_by, stats)
+    elif options.spill_routes is not None:
+        routes = SpillFrontier(context, options.spill_routes, options.spill_dir, dominance, stats)
+    else:
+        routes = Frontier()
+
+    root = Route(context, start, state=state, outcomes=options.dice.outcomes(capital, state) if options.dice is not None else None)
+    routes.push(root)
+    best_route = None
+    completed_routes = 0
 
-        if destination is None and max_profit is None and max_duration is None:
-            raise Exception("Complete condition is not finished")
+    # The incumbent is only returned if nothing better is found, it doesn't count towards patience so the search goes
+    # the same way as without it apart from bounds having a better route to beat from the start
+    incumbent = _follow(root, incumbent) if incumbent else None
+    target = incumbent
 
-    def is_complete(self, world, total_duration, profit):
-        if self.destination and self.destination.sector_hex == world.sector_hex:
-            return True
-        
-        if self.max_profit is not None and profit >= self.max_profit:
-            print(f"Yes Profit {profit} >= {self.max_profit} on {world.name}")
-            return True
-        
-        if self.max_duration is not None and total_duration >= self.max_duration:
-            return True
-        
-        return False
+    if bound is not None:
+        root.bound = bound.route_bound(root)
 
-STARTING_NET_WORTH = "STARTING_NET_WORTH"
+    try:
+        if incumbent is not None:
+            yield incumbent
 
-class Route:
-    def __init__(self, starting_capital, starting_net_worth, worlds, avoid, complete_condition, ship, data_loader, start_duration, route_duration = 0, state=dict(),profit =0, text=[]) -> None:
-        self.profit = profit
-        self.starting_capital = starting_capital
-        self.starting_net_worth = starting_net_worth
-        self.complete_condition = complete_condition
-        self.complete = complete_condition.is_complete(worlds[-1], route_duration, profit)
-        self.state = state
-        self.start_duration = start_duration
-        self.worlds = worlds
-        self.avoid = avoid
-        self.text = text
-        self.ship = ship
+        phases.start("search")
 
-        self.data_loader = data_loader
-        self.route_duration = route_duration
-        self.total_duration = route_duration + start_duration
+        while routes and (options.patience is None or completed_routes < options.patience):
+            if options.node_budget is not None and stats.expanded >= options.node_budget:
+                stats.stopped = "node budget"
+                break
 
-    def generate_next_steps(self):
-        if self.complete:
-            return []
+            if deadline is not None and time.perf_counter() >= deadline:
+                stats.stopped = "time budget"
+                break
 
-        current_world = self.worlds[-1]
-        trade_goods = self.data_loader.trade_goods()
-        starting_world = self.total_duration == 0
+            route = routes.pop()
 
-        for other_world in current_world.neighbours:
-            if self.complete_condition.destination and other_world in self.worlds:
+            if route.dominated:
                 continue
 
-            if self.worlds[-10:].count(other_world) > 1:
+            if bound is not None and bound.prunes(route, target):
+                stats.bounded += 1
                 continue
 
-            if other_world in self.avoid:
-                continue
-            if len(current_world.neighbours) > 2 and len(self.worlds) > 1 and self.worlds[-2] == other_world:
-                continue
+            if parallel is not None:
+                parallel.evaluate(route, routes)
 
-            if other_world.zone == "R":
-                continue
+            stats.expanded += 1
+            queued = []
 
-            if other_world.size is None:
-                continue
+            for new_route in route.generate_next_steps():
+                if new_route.complete:
+                    stats.completed += 1
+                    completed_routes += 1
+                    if new_route < best_route:
+                        completed_routes = 0
+                        best_route = new_route
 
-            for allegiance in self.ship.banned_allegiances:
-                if other_world.allegiance.startswith(allegiance):
+                        if new_route < target:
+                            target = new_route
+                            yield new_route
                     continue
 
-            distance = current_world.distance(other_world)
+                if bound is not None:
+                    new_route.bound = bound.route_bound(new_route)
+
+                    if bound.prunes(new_route, target):
+                        stats.bounded += 1
+                        continue
+
+                if dominance is None or dominance.add(new_route):
+                    routes.push(new_route)
+                    queued.append(new_route.world)
+
+            data_loader.prefetch(queued)
+
+            if len(routes) > stats.max_frontier:
+                stats.max_frontier = len(routes)
+
+            if options.trace:
+                stats.sample_frontier(len(routes))
+    finally:
+        # Also when the caller stops early, so the stats cover the search as far as it went
+        try:
+            # The last route yielded was the better of the incumbent and the best route found
+            if incumbent is not None and incumbent < best_route:
+                best_route = incumbent
+
+            if bound is not None and best_route is not None:
+                # Whatever is left on the frontier could still beat the best route by as much as its bound
+                stats.best_score = best_route.score()
+                stats.upper_bound = max((route.bound for route in routes if not route.dominated), default=stats.best_score)
+
+                if stats.beam_dropped_bound is not None:
+                    stats.upper_bound = max(stats.upper_bound, stats.beam_dropped_bound)
+        finally:
+            routes.close()
+
+class StopOrderPlanner:
+    # Picks the order to visit a set of stops in for the most profit per week. The best route between each pair of worlds is
+    # searched once from the starting capital and state and orders are scored by adding up those legs, so the order should be
+    # replanned leg by leg with the real capital once chosen
+    EXACT_LIMIT = 8
+
+    def __init__(self, capital, net_worth, ship, data_loader, start_duration, avoid, state, options=None, stats=None) -> None:
+        self.capital = capital
+        self.net_worth = net_worth
+        self.ship = ship
+        self.data_loader = data_loader
+        self.start_duration = start_duration
+        self.avoid = avoid
+        self.state = state
+        self.options = options
+        self.stats = stats
+        self.__legs = {}
 
-            if distance > self.ship.max_jump():
-                continue
+    def leg(self, origin, destination):
+        # (weeks, profit) of the best route between two worlds, None when there isn't one
+        key = (origin.id, destination.id)
 
-            text = []
-            capital = self.starting_capital + self.profit
-            cost = self.ship.fuel_cost(distance)
-            text.append(f"Buy unrefined fuel for {cost}, capital {capital:,.2f}->{capital - cost:,.2f}")
-            capital -= cost
-            duration = self.ship.jumps_required(distance) + 1
-            total_duration = self.total_duration + duration
-            state = self.state.copy()
+        if key not in self.__legs:
+            route = find_best_route(self.capital, self.net_worth, self.ship, self.data_loader, origin, CompleteCondition(destination), self.start_duration, self.avoid, self.state, self.options, self.stats)
+            self.__legs[key] = None if route is None else (route.route_duration, route.real_profit())
 
-            if math.floor(self.total_duration / 4) < math.floor(total_duration / 4):
-                text.append(f"Ship Maintenance paid of {self.ship.monthly_maint:,.2f}, capital: {capital:,.2f}->{capital-self.ship.monthly_maint:,.2f}")
-                capital -= self.ship.monthly_maint
+        return self.__legs[key]
 
-                life_support = self.ship.monthly_life_support(self.data_loader)
-                text.append(f"Ship Life Support paid of {life_support:,.2f}, capital: {capital:,.2f}->{capital-life_support:,.2f}")
-                capital -= life_support
+    def order(self, start, stops):
+        stops = list(dict.fromkeys(stops))
 
-                if self.ship.contract:
-                    income = self.ship.contract.monthly_income()
+        if len(stops) <= 1:
+            return stops
 
-                    if income > 0:
-                        text.append(f"Monthly Income of {income:,.2f}, capital: {capital:,.2f}->{capital+income:,.2f}")
-                        capital += income
+        if len(stops) <= self.EXACT_LIMIT:
+            return self.__exact_order(start, stops)
 
-                    mortgage_payment = self.ship.contract.mortgage_payment(state)
-                    if mortgage_payment > 0:
-                        text.append(f"Mortgage paid of {mortgage_payment:,.2f}, capital: {capital:,.2f}->{capital-mortgage_payment:,.2f}")
-                        capital -= mortgage_payment
+        return self.__heuristic_order(start, stops)
 
-            passenger_revenue, description = current_world.passengers(other_world, self.ship, starting_world)
+    def totals(self, start, order):
+        duration = 0
+        profit = 0
 
-            if passenger_revenue > 0: 
-                text.append(f"{description}, capital {capital:,.2f}->{passenger_revenue + capital:,.2f}")
-                capital += passenger_revenue 
+        for origin, destination in zip([start] + order, order):
+            leg = self.leg(origin, destination)
 
-            starting_capital, final_capital, deals = current_world.best_trades(other_world, trade_goods, self.ship, capital, starting_world)
+            if leg is None:
+                return None
 
-            if starting_capital is None:
-                continue
+            duration += leg[0]
+            profit += leg[1]
 
-            text += deals
+        return duration, profit
 
-            if self.ship.contract:
-                cut, description = self.ship.contract.profit_cut(state, other_world, starting_capital, final_capital)
+    def __rate(self, start, order):
+        totals = self.totals(start, order)
 
-                if cut is not None:
-                    text.append(description)
-                    final_capital -= cut
-            else:
-                text.append(f"No Maint or mortgage as we go from {self.total_duration}->{total_duration}")
+        if totals is None or totals[0] == 0:
+            return None
 
-            if final_capital < 0:
-                continue
+        return totals[1] / totals[0]
 
-            new_net_worth = final_capital
+    @staticmethod
+    def __pareto(labels):
+        # Of two partial orders over the same stops ending at the same stop the one that took longer for less profit can't do better
+        labels.sort(key=lambda label: (label[0], -label[1]))
+        kept = []
 
-            if self.ship.contract:
-                new_net_worth -= self.ship.contract.current_cut(state)
-                
-            text = self.text + [f"{bcolors.BOLD}{current_world.name} -> {other_world.name}{bcolors.ENDC} ({distance} hexes, {duration} weeks) {other_world.sector_hex} net worth {self.net_worth():,.2f} -> {new_net_worth:,.2f}"] + text
-            yield Route(self.starting_capital, self.starting_net_worth, self.worlds.copy() + [other_world],self.avoid, self.complete_condition, self.ship, self.data_loader, self.start_duration, total_duration,state, final_capital - self.starting_capital, text)
+        for label in labels:
+            if not kept or label[1] > kept[-1][1]:
+                kept.append(label)
 
-    def projected_duration(self):
-        if self.complete or not self.complete_condition.destination:
-            return self.route_duration
-        
-        remaining_distance = self.worlds[-1].distance(self.complete_condition.destination)
-        remaining_duration = self.ship.expected_duration(remaining_distance)
-        return self.route_duration + remaining_duration
+        return kept
 
-    def crow_flies(self):
-        if self.complete or not self.complete_condition.destination:
-            return self.route_duration
+    def __exact_order(self, start, stops):
+        count = len(stops)
+        labels = {}
 
-        return self.worlds[0].distance(self.complete_condition.destination)
-    
-    def net_worth(self):
-        net_worth = self.profit + self.starting_capital
+        for index, stop in enumerate(stops):
+            leg = self.leg(start, stop)
 
-        if self.ship.contract:
-            net_worth -= self.ship.contract.current_cut(self.state)
+            if leg is not None:
+                labels[(1 << index, index)] = [(leg[0], leg[1], (index,))]
 
-        return net_worth
+        for mask in range(1, 1 << count):
+            for last in range(count):
+                current = labels.get((mask, last))
 
-    def real_profit(self):
-        return self.net_worth() - self.starting_net_worth
-    
-    def profit_per_week(self):
-        return self.real_profit() / self.route_duration
+                if not current:
+                    continue
 
-    def __lt__(self, other):
-        if other is None:
-            return True
-        
-        factor = self.projected_duration() / other.projected_duration()
+                current = labels[(mask, last)] = self.__pareto(current)
 
-        other_capital_normalised = other.profit_per_week() * factor
-        return self.profit_per_week() > other_capital_normalised
+                for following in range(count):
+                    if mask & (1 << following):
+                        continue
 
-    
-    def __eq__(self, other):
-        return False
-        
-def find_best_route(capital, net_worth, ship, data_loader, start, destination, start_duration,avoid, state):
-    routes = [Route(capital, net_worth, [start], avoid, destination, ship, data_loader, start_duration, state=state)]
-    heapq.heapify(routes)
-    best_route = None
-    completed_routes = 0
+                    leg = self.leg(stops[last], stops[following])
 
-    while routes and completed_routes < 10:
-        route = heapq.heappop(routes)
+                    if leg is None:
+                        continue
 
-        for new_route in route.generate_next_steps():
-            if new_route.complete:
-                completed_routes += 1
-                if new_route < best_route:
-                    completed_routes = 0
-                    best_route = new_route
-            else:
-                heapq.heappush(routes,new_route)
-                routes.append(new_route)
+                    extended = labels.setdefault((mask | (1 << following), following), [])
 
-    return best_route
+                    for duration, profit, order in current:
+                        extended.append((duration + leg[0], profit + leg[1], order + (following,)))
+
+        full = (1 << count) - 1
+        finished = [label for last in range(count) for label in labels.get((full, last), []) if label[0] > 0]
+
+        if not finished:
+            return None
+
+        best = max(finished, key=lambda label: label[1] / label[0])
+        return [stops[index] for index in best[2]]
+
+    def __heuristic_order(self, start, stops):
+        # Greedily take the stop that keeps profit per week highest, then reverse stretches of the order while that helps
+        order = []
+        remaining = list(stops)
+
+        while remaining:
+            candidates = [(self.__rate(start, order + [stop]), stop) for stop in remaining]
+            candidates = [candidate for candidate in candidates if candidate[0] is not None]
+
+            if not candidates:
+                return None
+
+            stop = max(candidates, key=lambda candidate: candidate[0])[1]
+            order.append(stop)
+            remaining.remove(stop)
+
+        best_rate = self.__rate(start, order)
+        improved = True
+
+        while improved:
+            improved = False
+
+            for i in range(len(order) - 1):
+                for j in range(i + 1, len(order)):
+                    candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    rate = self.__rate(start, candidate)
+
+                    if rate is not None and rate > best_rate:
+                        order, best_rate = candidate, rate
+                        improved = True
+
+        return order
+
+
+class Replanner:
+    # Plans a journey, then plans what is left of it each time the ship arrives somewhere, usually with a new snapshot.
+    # The loader keeps the world graph and leg caches from one plan to the next, a snapshot only drops the legs that used
+    # the world's old one, and the rest of the last plan, replayed from where the ship is with its real capital, is the
+    # route the new search starts out having to beat
+    def __init__(self, ship, data_loader, destination=None, max_profit=None, max_duration=None, avoid=[], options=None) -> None:
+        self.ship = ship
+        self.data_loader = data_loader
+        self.destination = destination
+        self.max_profit = max_profit
+        self.max_duration = max_duration
+        self.avoid = avoid
+        self.options = options
+        self.plan = None
+        self.__remaining = []
+        self.__starting_capital = None
+        self.__start_duration = None
+
+    def start(self, world, capital, state, duration=0, snapshot=None, stats=None):
+        self.__starting_capital = capital
+        self.__start_duration = duration
+        self.__remaining = []
+        return self.arrive(world, capital, state, duration, snapshot, stats)
+
+    def arrive(self, world, capital, state, duration, snapshot=None, stats=None):
+        # The ship is at world after duration weeks with capital and contract state, None once the journey is over. A snapshot
+        # is only good for the visit it was taken on, so arriving without one clears any left from an earlier visit along
+        # with the legs worked out from it
+        world.set_trade_snapshot(snapshot)
+
+        condition = self.__remaining_condition(world, capital, duration)
+
+        if condition is None:
+            self.plan = None
+            self.__remaining = []
+            return None
+
+        incumbent = self.__remaining[1:] if self.__remaining and self.__remaining[0] == world else None
+        net_worth = capital
+
+        if self.ship.contract:
+            net_worth -= self.ship.contract.current_cut(state)
+
+        self.plan = find_best_route(capital, net_worth, self.ship, self.data_loader, world, condition, duration, self.avoid, state, self.options, stats, incumbent)
+        self.__remaining = self.plan.worlds[1:] if self.plan is not None else []
+        return self.plan
 
+    def __remaining_condition(self, world, capital, duration):
+        if self.destination is not None and self.destination == world:
+            return None
+
+        max_duration = None
+        max_profit = None
+
+        if self.max_duration is not None:
+            max_duration = self.max_duration - (duration - self.__start_duration)
+
+            if max_duration <= 0:
+                return None
 
+        if self.max_profit is not None:
+            max_profit = self.max_profit - (capital - self.__starting_capital)
+
+            if max_profit <= 0:
+                return None
+
+        return CompleteCondition(self.destination, max_profit, max_duration)
 
 class Passage:
     def __init__(self, type, number) -> None:
@@ -829,25 +3494,42 @@ class PerfectStrangerContract:
     
     def current_cut(self, state):
         return state.get(UNCUT_PROFITS, 0) * .75
+
+    def kept_profit_share(self):
+        # Net worth only ever keeps a quarter of trade profits, cut now or owed later
+        return .25
     
     def profit_cut(self, state, world, starting_capital, final_capital):
         if final_capital < starting_capital:
-            return 0, "No profits to cut"
+            return 0, LogLine("No profits to cut")
         
         profit = final_capital - starting_capital
         uncut_profit = state.get(UNCUT_PROFITS, 0)
 
         if world.sector_hex in NEU_BAYERN:
             state[UNCUT_PROFITS] = profit + uncut_profit
-            return 0, f"No Bank of Amondiage in {world.name} uncut profits rise from {uncut_profit} to {uncut_profit + profit:,.2f}"
+            return 0, LogLine("No Bank of Amondiage in {} uncut profits rise from {} to {:,.2f}", world.name, uncut_profit, uncut_profit + profit)
             
         cut = (profit + uncut_profit) *.75
         
         if uncut_profit > 0:
             del state[UNCUT_PROFITS]
-            return cut, f"Stern Metal takes 75% ({cut:,.2f}) of the of total profits {uncut_profit + profit:,.2f} since last world with a Bank of Amondiage, capital: {final_capital:,.2f} -> {final_capital - cut:,.2f}"
+            return cut, LogLine("Stern Metal takes 75% ({:,.2f}) of the of total profits {:,.2f} since last world with a Bank of Amondiage, capital: {:,.2f} -> {:,.2f}", cut, uncut_profit + profit, final_capital, final_capital - cut)
         else:
-            return cut, f"Stern Metal takes 75% of the of total profits, capital: {final_capital:,.2f} -> {final_capital - cut:,.2f}"
+            return cut, LogLine("Stern Metal takes 75% of the of total profits, capital: {:,.2f} -> {:,.2f}", final_capital, final_capital - cut)
+
+    def profit_cuts(self, state, world, starting_capital, final_capital):
+        # profit_cut for arrays of simulated capital, uncut profits are kept per sample
+        profitable = final_capital >= starting_capital
+        profit = np.where(profitable, final_capital - starting_capital, 0)
+        uncut_profit = state.get(UNCUT_PROFITS, 0)
+
+        if world.sector_hex in NEU_BAYERN:
+            state[UNCUT_PROFITS] = profit + uncut_profit
+            return 0
+
+        state[UNCUT_PROFITS] = np.where(profitable, 0, uncut_profit)
+        return np.where(profitable, (profit + uncut_profit) * .75, 0)
 
 def parse_text(text):
     try:
@@ -886,8 +3568,12 @@ def get_md5_hash(text):
     # Return the hexadecimal representation of the hash
     return md5_hash.hexdigest()
 
+SNAPSHOT_CACHE_DIR = "cache/tradeSnapshot"
+# Bump when the structure produced by parse_trade_snapshot changes so stale parsed files are ignored
+SNAPSHOT_CACHE_VERSION = 1
+
 def get_trade_snapshot_html(url):
-    cache_dir = "cache/tradeSnapshot"
+    cache_dir = SNAPSHOT_CACHE_DIR
     Path(cache_dir).mkdir(parents=True, exist_ok=True)
     hash = get_md5_hash(url)
     snapshot_file = f"{cache_dir}/{hash}"
@@ -903,9 +3589,35 @@ def get_trade_snapshot_html(url):
     return r.content
 
 
-def get_trade_snapshot(url):
-    result = get_trade_snapshot_html(url)
-    soup = BeautifulSoup(result, 'html.parser')
+def get_trade_snapshot(url, parser="html.parser", timing=None):
+    # The parsed snapshot is kept next to the HTML so warm runs skip BeautifulSoup, parser can be "lxml" when it is installed.
+    # timing is a dict given the seconds taken and the parser used, None when the parsed snapshot was cached
+    start_time = time.perf_counter()
+    parsed_file = f"{SNAPSHOT_CACHE_DIR}/{get_md5_hash(url)}.json"
+    d = None
+
+    if os.path.isfile(parsed_file):
+        with open(parsed_file, 'r') as file:
+            cached = json.load(file)
+
+        if cached.get("version") == SNAPSHOT_CACHE_VERSION:
+            d = cached["snapshot"]
+            parser = None
+
+    if d is None:
+        d = parse_trade_snapshot(get_trade_snapshot_html(url), parser)
+
+        with open(parsed_file, 'w') as file:
+            json.dump({"version": SNAPSHOT_CACHE_VERSION, "snapshot": d}, file, separators=(",", ":"))
+
+    if timing is not None:
+        timing["seconds"] = time.perf_counter() - start_time
+        timing["parser"] = parser
+
+    return d
+
+def parse_trade_snapshot(result, parser="html.parser"):
+    soup = BeautifulSoup(result, parser)
     header = soup.find('h3', string='Available Trade Goods')
     table = header.find_next('table')
 
@@ -940,6 +3652,208 @@ def get_trade_snapshot(url):
 
     return d
 
+def load_ship(data):
+    contract = data.get("contract")
+
+    if contract is None:
+        pass
+    elif contract["type"] == "mortgage":
+        contract = Mortgage(contract["mortgage"], contract.get("monthly_payment"))
+    elif contract["type"] == "perfect_stranger":
+        contract = PerfectStrangerContract()
+    else:
+        raise Exception(f"Unknown contract {contract['type']}")
+
+    passage = [Passage(item["type"], item["number"]) for item in data.get("passage", [])]
+    return Ship(data["monthly_maint"], data["fuel_per_jump"], data["max_jump"], data["fuel_tank"], data["cargo"], data["cargo_fuel"], passage, contract, data["max_steward"], data["max_broker"], data.get("banned_allegiances", []))
+
+def parse_sector_hex(text):
+    # "Trojan Reach 2819", the hex is whatever follows the last space
+    sector, hex = text.rsplit(" ", 1)
+    return SectorHex(sector, hex)
+
+def scenario_ship(scenario, ships):
+    # A scenario names one of the batch's ships or describes its own, its contract replaces the ship's when given
+    ship = scenario["ship"]
+    data = dict(ships[ship] if isinstance(ship, str) else ship)
+
+    if "contract" in scenario:
+        data["contract"] = scenario["contract"]
+
+    return load_ship(data)
+
+def scenario_options(data):
+    options = {"dominance_pruning": True, **data}
+
+    if options.get("dice") is not None:
+        options["dice"] = DiceSimulator(**options["dice"])
+
+    return SearchOptions(**options)
+
+def route_summary(route, stats):
+    summary = {
+        "worlds": [{"name": world.name, "location": str(world.sector_hex)} for world in route.worlds],
+        "weeks": route.route_duration,
+        "profit": route.real_profit(),
+        "capital": route.capital(),
+        "net_worth": route.net_worth(),
+        "stats": stats.as_dict(),
+    }
+
+    if route.outcomes is not None:
+        profits = route.outcome_profits()
+        summary["simulated_profit"] = {"mean": float(profits.mean()), "loss_chance": float((profits < 0).mean()), "percentiles": {str(percentile): float(profit) for percentile, profit in route.context.dice.bands(route).items()}}
+
+    return summary
+
+def plan_scenario(scenario, ships, data_loaders, snapshots):
+    # Plans the stops in order and then the open ended leg if there is one, each leg carries on with the capital, net
+    # worth and contract state the last one finished with
+    ship = scenario_ship(scenario, ships)
+    data_loader = data_loaders[ship.max_jump()]
+    start = data_loader.load_world_data(parse_sector_hex(scenario["start"]))
+    stops = [data_loader.load_world_data(parse_sector_hex(stop)) for stop in scenario.get("stops", [])]
+    avoid = [data_loader.load_world_data(parse_sector_hex(world)) for world in scenario.get("avoid", [])]
+    options = scenario_options(scenario.get("options", {}))
+    capital = scenario["capital"]
+    state = dict(scenario.get("state", {}))
+    net_worth = capital
+
+    if ship.contract:
+        net_worth -= ship.contract.current_cut(state)
+
+    trade_snapshot = scenario.get("trade_snapshot")
+    snapshot = snapshots.get(trade_snapshot)
+
+    if trade_snapshot:
+        max_jump_distance = int(parse_qs(urlparse(trade_snapshot).query).get('maxJumpDistance', [0])[0])
+
+        if max_jump_distance != ship.max_jump():
+            raise Exception(f"Snapshot jump distance should be {ship.max_jump()} not {max_jump_distance}")
+
+    starting_net_worth = net_worth
+    duration = 0
+    legs = []
+    result = {"name": scenario.get("name"), "legs": legs}
+
+    # The start world is shared with every other scenario so its snapshot is only set for as long as this one runs
+    if snapshot is not None:
+        start.set_trade_snapshot(snapshot)
+
+    try:
+        if scenario.get("optimise_stop_order") and len(stops) > 1:
+            stops = StopOrderPlanner(capital, net_worth, ship, data_loader, 0, avoid, state, options).order(start, stops) or stops
+
+        conditions = [CompleteCondition(stop) for stop in stops]
+
+        if scenario.get("max_profit") is not None or scenario.get("max_duration") is not None:
+            conditions.append(CompleteCondition(max_profit=scenario.get("max_profit"), max_duration=scenario.get("max_duration")))
+
+        origin = start
+
+        for condition in conditions:
+            stats = SearchStats()
+            best_route = find_best_route(capital, net_worth, ship, data_loader, origin, condition, duration, avoid, state, options, stats)
+
+            if best_route is None:
+                result["error"] = "Unable to find viable route"
+                return result
+
+            legs.append(route_summary(best_route, stats))
+            capital = best_route.capital()
+            net_worth = best_route.net_worth()
+            state = best_route.state
+            duration += best_route.route_duration
+            origin = best_route.world
+    finally:
+        if snapshot is not None:
+            start.set_trade_snapshot(None)
+
+    profit = net_worth - starting_net_worth
+    result.update({"weeks": duration, "profit": profit, "profit_per_week": profit / duration if duration else None})
+    return result
+
+# Set in the parent before the pool forks so workers plan from the loaded data without it being pickled
+_batch_scenarios = None
+_batch_ships = None
+_batch_data_loaders = None
+_batch_snapshots = None
+
+def _plan_batch_scenario(index):
+    scenario = _batch_scenarios[index]
+    started = time.perf_counter()
+
+    try:
+        result = plan_scenario(scenario, _batch_ships, _batch_data_loaders, _batch_snapshots)
+    except Exception as e:
+        result = {"name": scenario.get("name"), "error": str(e)}
+
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+def plan_batch(scenario_file, output_file, workers=1):
+    # Plans every scenario in a JSON file of {"sectors": [...], "ships": {name: ship}, "scenarios": [...]} and writes one
+    # JSON line per scenario in the order given. Worlds, neighbourhoods, rule tables and snapshots are loaded once by one
+    # DataLoader per jump range before any worker is forked, so scenarios share them and each worker's leg cache
+    global _batch_scenarios, _batch_ships, _batch_data_loaders, _batch_snapshots
+
+    with open(scenario_file, 'r') as file:
+        batch = json.load(file)
+
+    ships = batch.get("ships", {})
+    scenarios = batch["scenarios"]
+
+    # Pool workers are daemonic so they can't fork the leg evaluators of a search of their own
+    if workers > 1 and any(scenario.get("options", {}).get("workers", 1) > 1 for scenario in scenarios):
+        raise Exception("Scenarios can't use more than one worker when the batch does")
+
+    sector_store = SectorStore()
+
+    for sector in batch.get("sectors", []):
+        sector_store.load_sector(sector)
+
+    world_database = WorldDatabase()
+    data_loaders = dict()
+
+    for scenario in scenarios:
+        try:
+            max_jump = scenario_ship(scenario, ships).max_jump()
+        except Exception:
+            # Reported when the scenario is planned
+            continue
+
+        data_loader = data_loaders.get(max_jump)
+
+        if data_loader is None:
+            data_loader = data_loaders[max_jump] = DataLoader(max_jump, sector_store, world_database=world_database)
+            data_loader.warm_load()
+            data_loader.trade_goods()
+            data_loader.price_table()
+
+        for world in [scenario["start"]] + scenario.get("stops", []) + scenario.get("avoid", []):
+            data_loader.load_world_data(parse_sector_hex(world)).neighbours
+
+    trade_snapshots = {scenario["trade_snapshot"] for scenario in scenarios if scenario.get("trade_snapshot")}
+    snapshots = {url: get_trade_snapshot(url) for url in trade_snapshots}
+
+    _batch_scenarios = scenarios
+    _batch_ships = ships
+    _batch_data_loaders = data_loaders
+    _batch_snapshots = snapshots
+
+    with open(output_file, 'w') as output:
+        if workers > 1:
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                results = pool.imap(_plan_batch_scenario, range(len(scenarios)))
+
+                for result in results:
+                    output.write(json.dumps(result) + "\n")
+                    output.flush()
+        else:
+            for index in range(len(scenarios)):
+                output.write(json.dumps(_plan_batch_scenario(index)) + "\n")
+                output.flush()
+
 def main():
     perfect_stranger = Ship(8946.84, 40, 1, 40, 12, 160, [Passage("low", 9), Passage("middle", 10)], PerfectStrangerContract(), 2, 2)
     solo_ship = Ship(3737, 10, 2, 20,18, 0, [Passage("middle", 1)], Mortgage(44840250), 2, 2)
@@ -948,8 +3862,12 @@ def main():
     booty_pirates_trader = Ship(5516, 20, 2, 20,66, 20, [], Mortgage(47610000), 2, 4, ["Im", "As"])
 
     ship = perfect_stranger
-    data_loader = DataLoader(ship.max_jump())
+    sector_store = SectorStore()
+    sector_store.load_sector("Reft")
+    data_loader = DataLoader(ship.max_jump(), sector_store, world_database=WorldDatabase())
+    data_loader.warm_load()
 
+    snapshot_parser = "html.parser"
     trade_snapshot = "https://travellertools.azurewebsites.net/Home/TradeInfo?sectorX=-3&sectorY=0&hexX=18&hexY=22&maxJumpDistance=5&brokerScore=2&advancedMode=False&illegalGoods=False&edition=Mongoose2&seed=1583474473&advancedCharacters=False&streetwiseScore=2&milieu=M1105"
     
     #start = data_loader.load_world_data(SectorHex("Trojan Reach", "2819"))
@@ -967,9 +3885,15 @@ def main():
     start = data_loader.load_world_data(SectorHex("Reft", "1822"))
 
     if trade_snapshot:
-        snapshot = get_trade_snapshot(trade_snapshot)
+        timing = dict()
+        snapshot = get_trade_snapshot(trade_snapshot, snapshot_parser, timing)
         start.set_trade_snapshot(snapshot)
 
+        if timing["parser"] is None:
+            print(f"Loaded parsed trade snapshot in {timing['seconds']:.3f}s")
+        else:
+            print(f"Parsed trade snapshot with {timing['parser']} in {timing['seconds']:.3f}s")
+
     stops = [
         SectorHex("Reft", "1426"),
     ]
@@ -989,6 +3913,9 @@ def main():
     max_profit = None
     max_duration = None
     percentage_increase = 0
+    dice = None
+    options = SearchOptions(dominance_pruning=True, dice=dice)
+    optimise_stop_order = False
     state = {
         UNCUT_PROFITS: uncut_profits
     }
@@ -997,14 +3924,31 @@ def main():
     if ship.contract:
         net_worth -= ship.contract.current_cut(state)
 
+    if optimise_stop_order and len(stops) > 1:
+        stats = SearchStats()
+        stops = StopOrderPlanner(capital, net_worth, ship, data_loader, duration, avoid, state, options, stats).order(start, stops)
+        print(stats)
+
+        if stops is None:
+            print("Unable to find viable route")
+            return
+
+        print(f"Visiting stops in order {', '.join(stop.name for stop in stops)}")
+
     for stop in stops:
-        best_route = find_best_route(capital + profit,net_worth, ship, data_loader, start, CompleteCondition(stop), duration, avoid, state)
+        stats = SearchStats()
+        best_route = find_best_route(capital + profit,net_worth, ship, data_loader, start, CompleteCondition(stop), duration, avoid, state, options, stats)
+        print(stats)
         state = best_route.state
         if best_route is None:
             print("Unable to find viable route")
             return
 
         print("\n".join(best_route.text))
+
+        if dice is not None:
+            print(dice.describe(best_route))
+
         duration += best_route.route_duration
         percentage_increase += (duration * best_route.real_profit()) / (net_worth + profit)
         profit += best_route.real_profit()
@@ -1012,7 +3956,9 @@ def main():
         start = stop
 
     if max_profit is not None or max_duration is not None:
-        best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(max_profit=max_profit, max_duration=max_duration), duration, avoid)
+        stats = SearchStats()
+        best_route = find_best_route(capital, net_worth, ship, data_loader, start, CompleteCondition(max_profit=max_profit, max_duration=max_duration), duration, avoid, state, options, stats)
+        print(stats)
         if best_route is None:
             print("Unable to find viable route")
             return
@@ -1020,8 +3966,17 @@ def main():
         percentage_increase = (duration * best_route.real_profit()) / net_worth
         profit = best_route.real_profit()
         print("\n".join(best_route.text))
+
+        if dice is not None:
+            print(dice.describe(best_route))
     
+    print(data_loader.leg_cache())
     print(f"Route takes {duration} weeks and a total profit of {profit:,.2f} which is {profit/duration:,.2f} or {percentage_increase/ duration:,.2f}% per week")
     
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # python trade.py scenarios.json results.jsonl [workers]
+        plan_batch(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+    else:
+        main()